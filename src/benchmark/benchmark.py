@@ -0,0 +1,261 @@
+"""
+Offline benchmarks of the parsing hot paths.
+
+Runs the QGuide analyzer (analyze), the myHarvard course page parser
+(CourseScraper.parse) and the search results parser (extract_course_info) over
+saved pages, without any network access, and reports for each:
+
+- total time and pages per second (best of `repeat` runs)
+- time per stage (read, parse, tables, stats, sentiment, extract and everything else)
+- peak RSS of the benchmark process
+
+Results are written as JSON, tagged with the git commit, so runs on different
+commits can be compared with compare().
+
+Stages are timed by temporarily wrapping the functions the code under test calls
+(make_soup, index_tables, ...), so nothing in the pipelines themselves changes.
+"""
+
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+REPO_ROOT = os.path.join(SRC_DIR, '..')
+# The pipelines import their siblings by bare name, so put their folders on the path
+for folder in ('qguide', 'myharvard'):
+    sys.path.append(os.path.join(SRC_DIR, folder))
+sys.path.append(SRC_DIR)
+
+import analyzer  # noqa: E402
+import get_course_myharvard  # noqa: E402
+import get_myharvard_url_chunks  # noqa: E402
+import sentiment  # noqa: E402
+from common import parsing  # noqa: E402
+
+# Saved QGuide pages checked into the archive, used unless another folder is given
+DEFAULT_QGUIDE_DIR = os.path.join(REPO_ROOT, 'archive', 'spring_2023', 'QGuides')
+
+
+class StageTimer:
+    """Accumulate wall time per stage while the wrapped functions run."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self._patches: List[tuple] = []
+
+    def wrap(self, owner: Any, name: str, stage: str, func: Optional[Callable] = None):
+        """Replace owner.name (or func standing in for it) by a version that adds its run time to stage."""
+        original = getattr(owner, name)
+        func = func or original
+        seconds, calls = self.seconds, self.calls
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds[stage] += time.perf_counter() - start
+                calls[stage] += 1
+
+        setattr(owner, name, timed)
+        self._patches.append((owner, name, original))
+
+    def restore(self):
+        while self._patches:
+            owner, name, original = self._patches.pop()
+            setattr(owner, name, original)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(name: str, items: List[Any], run_one: Callable[[Any], Any],
+                  setup: Callable[[StageTimer], None], repeat: int = 3,
+                  rest_stage: str = 'other') -> Dict[str, Any]:
+    """
+    Time run_one over every item, `repeat` times, keeping the fastest run.
+
+    Time outside the wrapped stages is reported as rest_stage.
+    """
+    best = None
+    errors = 0
+    for _ in range(repeat):
+        # Every run starts cold, so the sentiment memo doesn't make later runs look faster
+        sentiment._compound.cache_clear()
+        timer = StageTimer()
+        setup(timer)
+        errors = 0
+        start = time.perf_counter()
+        try:
+            # The pipelines print progress for every page
+            with contextlib.redirect_stdout(io.StringIO()):
+                for item in items:
+                    try:
+                        run_one(item)
+                    except Exception:
+                        errors += 1
+        finally:
+            elapsed = time.perf_counter() - start
+            timer.restore()
+        if best is None or elapsed < best[0]:
+            best = (elapsed, timer)
+
+    elapsed, timer = best
+    stages = dict(timer.seconds)
+    stages[rest_stage] = max(0.0, elapsed - sum(stages.values()))
+    result = {
+        'pages': len(items),
+        'errors': errors,
+        'seconds': round(elapsed, 4),
+        'pages_per_sec': round(len(items) / elapsed, 2) if elapsed else None,
+        'stages': {stage: round(seconds, 4) for stage, seconds in stages.items()},
+        'calls': dict(timer.calls),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+    print(f"{name}: {len(items)} pages in {elapsed:.2f}s ({result['pages_per_sec']} pages/sec), "
+          f"{errors} errors, peak RSS {result['peak_rss_mb']} MB")
+    for stage, seconds in sorted(stages.items(), key=lambda item: -item[1]):
+        print(f"  {stage:<10} {seconds:8.3f}s  {100 * seconds / elapsed:5.1f}%")
+    return result
+
+
+def bench_qguide(qguide_dir: str, limit: Optional[int], repeat: int) -> Dict[str, Any]:
+    """analyze() over saved QGuide pages."""
+    codes = sorted(os.path.basename(path)[:-len('.html')]
+                   for path in glob.glob(os.path.join(qguide_dir, '*.html')))[:limit]
+    read_qguide_tables = analyzer.read_qguide_tables
+
+    def setup(timer: StageTimer):
+        timer.wrap(analyzer, 'read_qguide_tables', 'read', lambda code: read_qguide_tables(code, qguide_dir))
+        timer.wrap(analyzer, 'make_soup', 'parse')
+        timer.wrap(analyzer, 'index_tables', 'tables')
+        timer.wrap(analyzer, 'histogram_stats', 'stats')
+        timer.wrap(analyzer, 'histogram_mode', 'stats')
+        timer.wrap(sentiment, 'compound_many', 'sentiment')
+        timer.wrap(sentiment, 'compound', 'sentiment')
+
+    # Load the VADER lexicon up front so the first run isn't charged for it
+    sentiment.get_analyzer()
+    return run_benchmark('qguide analyze', codes, analyzer.analyze, setup, repeat)
+
+
+def bench_course_pages(course_dir: str, limit: Optional[int], repeat: int) -> Dict[str, Any]:
+    """CourseScraper.parse over saved beta.my.harvard.edu course pages."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(course_dir, '*.html')))[:limit]:
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+    scraper = get_course_myharvard.CourseScraper('')
+
+    def setup(timer: StageTimer):
+        timer.wrap(get_course_myharvard, 'make_soup', 'parse')
+
+    # Everything in parse() but building the soup is extraction
+    return run_benchmark('myharvard course pages', pages, scraper.parse, setup, repeat, 'extract')
+
+
+def bench_search_pages(search_dir: str, limit: Optional[int], repeat: int) -> Dict[str, Any]:
+    """extract_course_info over saved search API responses (JSON with the 'hits' HTML)."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(search_dir, '*.json')))[:limit]:
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append(json.load(f).get('hits', ''))
+
+    def setup(timer: StageTimer):
+        timer.wrap(get_myharvard_url_chunks, 'make_soup', 'parse')
+
+    return run_benchmark('myharvard search pages', pages,
+                         get_myharvard_url_chunks.extract_course_info, setup, repeat, 'extract')
+
+
+def run_all(qguide_dir: Optional[str] = DEFAULT_QGUIDE_DIR, course_dir: Optional[str] = None,
+            search_dir: Optional[str] = None, limit: Optional[int] = None,
+            repeat: int = 3) -> Dict[str, Any]:
+    """Run every benchmark whose fixture folder exists and return the results."""
+    results: Dict[str, Any] = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'html_parser': parsing.DEFAULT_BACKEND,
+        'limit': limit,
+        'repeat': repeat,
+        'benchmarks': {},
+    }
+    benchmarks = [
+        ('qguide_analyze', bench_qguide, qguide_dir),
+        ('myharvard_course_parse', bench_course_pages, course_dir),
+        ('myharvard_search_parse', bench_search_pages, search_dir),
+    ]
+    for name, bench, folder in benchmarks:
+        if not folder or not os.path.isdir(folder):
+            print(f"Skipping {name}: no fixture folder {folder!r}")
+            continue
+        results['benchmarks'][name] = bench(folder, limit, repeat)
+    return results
+
+
+def compare(old_path: str, new_path: str):
+    """Print the change in pages/sec and per stage between two result files."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    for name, new_result in new['benchmarks'].items():
+        old_result = old['benchmarks'].get(name)
+        if not old_result:
+            continue
+        speedup = new_result['pages_per_sec'] / old_result['pages_per_sec']
+        print(f"{name}: {old_result['pages_per_sec']} -> {new_result['pages_per_sec']} pages/sec "
+              f"({speedup:.2f}x)")
+        for stage, seconds in new_result['stages'].items():
+            old_seconds = old_result['stages'].get(stage)
+            if old_seconds is not None:
+                print(f"  {stage:<10} {old_seconds:8.3f}s -> {seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    # Fixture folders; the myHarvard ones are skipped when missing. Saved course pages
+    # can come from CourseScraper(debug=True), which writes them to debug_html/, and
+    # search pages are the JSON responses of the search API
+    qguide_dir = DEFAULT_QGUIDE_DIR
+    course_dir = os.path.join(SRC_DIR, 'myharvard', 'debug_html')
+    search_dir = os.path.join(SRC_DIR, 'myharvard', 'search_pages')
+    # Number of pages per benchmark (None for all of them) and runs per benchmark
+    limit = 300
+    repeat = 3
+
+    results = run_all(qguide_dir, course_dir, search_dir, limit, repeat)
+    os.makedirs('results', exist_ok=True)
+    output = os.path.join('results', f"{results['timestamp'].replace(':', '')}_{results['commit']}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    # Compare against an earlier run:
+    # compare('results/<earlier>.json', output)
@@ -0,0 +1,224 @@
+"""
+Command line entry point for the whole pipeline.
+
+    myharvard-qguide discover myharvard --year 2026 --term Spring
+    myharvard-qguide scrape
+    myharvard-qguide discover qguide
+    myharvard-qguide download
+    myharvard-qguide analyze
+    myharvard-qguide combine --myharvard 2026 Spring
+    myharvard-qguide export --myharvard 2026 Spring
+
+Each subcommand runs the same code as the stage's script, in the stage's folder
+(src/myharvard, src/qguide or src/hugems, or --workdir), so it reads and writes the
+same files. Only argparse is imported up front: the stage modules and their
+dependencies (pandas, BeautifulSoup, NLTK, ...) are imported inside the subcommand
+that runs them, so --help answers without loading any of them.
+"""
+
+import argparse
+import importlib
+import os
+import sys
+from typing import List, Optional, Sequence
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+TERMS = ("Spring", "Fall")
+
+
+def load_stage(folder: str, module: str):
+    """Import a stage module the way its scripts import each other, from its own folder."""
+    stage_dir = os.path.join(SRC_DIR, folder)
+    if stage_dir not in sys.path:
+        sys.path.insert(0, stage_dir)
+    if SRC_DIR not in sys.path:
+        sys.path.append(SRC_DIR)
+    return importlib.import_module(module)
+
+
+def run_stage(args: argparse.Namespace, folder: str, name: str, run):
+    """Run a stage in its working directory, profiled like its script (PIPELINE_PROFILE)."""
+    os.chdir(args.workdir or os.path.join(SRC_DIR, folder))
+    from common.instrumentation import profiled
+
+    with profiled(name):
+        return run()
+
+
+def term(value: str) -> str:
+    value = value.capitalize()
+    if value not in TERMS:
+        raise argparse.ArgumentTypeError(f"term must be one of {', '.join(TERMS)}")
+    return value
+
+
+def output_formats(args: argparse.Namespace) -> List[str]:
+    return ["csv", "parquet"] if args.parquet else ["csv"]
+
+
+def pairing(values: Optional[Sequence[str]], flag: str) -> Optional[List[str]]:
+    """Check a YEAR TERM pair given on the command line, e.g. ["2026", "spring"] -> ["2026", "Spring"]."""
+    if values is None:
+        return None
+    year, season = values
+    if not year.isdigit() or season.capitalize() not in TERMS:
+        raise SystemExit(f"{flag} takes a year and a term, e.g. {flag} 2026 Spring")
+    return [year, season.capitalize()]
+
+
+def terms(args: argparse.Namespace):
+    """The myHarvard term and the QGuide term, by default the same term a year earlier."""
+    myharvard = pairing(args.myharvard, "--myharvard")
+    qguide = pairing(args.qguide, "--qguide") or [str(int(myharvard[0]) - 1), myharvard[1]]
+    return myharvard, qguide
+
+
+def discover(args: argparse.Namespace):
+    if args.source == "myharvard":
+        if not args.year or not args.term:
+            raise SystemExit("discover myharvard needs --year and --term")
+        stage = load_stage("myharvard", "get_myharvard_url_chunks")
+        run_stage(args, "myharvard", "get_myharvard_url_chunks",
+                  lambda: stage.main(args.year, args.term, args.start_page, args.workers or 8))
+    else:
+        stage = load_stage("qguide", "scraper")
+        run_stage(args, "qguide", "scraper", lambda: stage.main(args.qreports))
+
+
+def scrape(args: argparse.Namespace):
+    use_cache = not args.no_cache
+    use_store = not args.no_store
+    if args.delta:
+        stage = load_stage("myharvard", "course_delta")
+        run_stage(args, "myharvard", "course_delta",
+                  lambda: stage.main(args.full_refresh_hours, args.workers or 32, use_cache, use_store))
+    else:
+        stage = load_stage("myharvard", "get_all_course_data")
+        run_stage(args, "myharvard", "get_all_course_data",
+                  lambda: stage.main(use_cache, output_formats(args), use_store, args.offline, args.sample))
+
+
+def download(args: argparse.Namespace):
+    raw_store = None if args.no_store else "raw_pages"
+    if args.use_async:
+        stage = load_stage("qguide", "async_downloader")
+        run_stage(args, "qguide", "async_downloader",
+                  lambda: stage.main(args.concurrency or 50, raw_store))
+    else:
+        stage = load_stage("qguide", "downloader")
+        run_stage(args, "qguide", "downloader", lambda: stage.main(args.concurrency or 64, raw_store))
+
+
+def analyze(args: argparse.Namespace):
+    raw_store = None if args.no_store else "raw_pages"
+    if args.download:
+        stage = load_stage("qguide", "pipeline")
+        run_stage(args, "qguide", "pipeline",
+                  lambda: stage.main(args.concurrency or 64, args.workers, args.queue_size,
+                                     not args.no_cache, output_formats(args), raw_store))
+    else:
+        stage = load_stage("qguide", "analyzer")
+        run_stage(args, "qguide", "analyzer",
+                  lambda: stage.main(args.workers, not args.no_cache, output_formats(args), raw_store))
+
+
+def combine(args: argparse.Namespace):
+    if args.batch:
+        stage = load_stage("hugems", "combine")
+        run_stage(args, "hugems", "combine",
+                  lambda: stage.combine_batch(workers=args.workers or 4, output_formats=output_formats(args)))
+        return
+    if not args.myharvard:
+        raise SystemExit("combine needs --myharvard YEAR TERM, or --batch")
+    myharvard, qguide = terms(args)
+    stage = load_stage("hugems", "combine")
+    run_stage(args, "hugems", "combine",
+              lambda: stage.combine_csv_files(*myharvard, *qguide, output_formats=output_formats(args)))
+
+
+def export(args: argparse.Namespace):
+    myharvard, qguide = terms(args)
+    stage = load_stage("hugems", "export")
+    run_stage(args, "hugems", "export",
+              lambda: stage.export_release(*myharvard, *qguide, workers=args.workers or 8,
+                                           serializer=args.serializer))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="myharvard-qguide",
+        description="Scrape myHarvard and the QGuide and combine them for hugems.net.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--workdir", help="folder to read and write the stage's files in "
+                                          "(default: the stage's folder under src/)")
+    common.add_argument("--workers", type=int, help="threads or processes to use")
+
+    sub = subparsers.add_parser("discover", parents=[common],
+                                help="list the courses of a term (course_urls.txt or courses.csv)")
+    sub.add_argument("source", choices=("myharvard", "qguide"))
+    sub.add_argument("--year", help="myHarvard year, e.g. 2026")
+    sub.add_argument("--term", type=term, help="myHarvard term, Spring or Fall")
+    sub.add_argument("--start-page", type=int, default=1, help="resume myHarvard search from this page")
+    sub.add_argument("--qreports", default="QReports.html", help="saved QReports page to read QGuide links from")
+    sub.set_defaults(run=discover)
+
+    sub = subparsers.add_parser("scrape", parents=[common],
+                                help="scrape the myHarvard courses in course_urls.txt into all_courses.csv")
+    sub.add_argument("--no-cache", action="store_true", help="download every page instead of revalidating")
+    sub.add_argument("--no-store", action="store_true", help="don't save pages to raw_pages/")
+    sub.add_argument("--offline", action="store_true", help="re-parse the pages in raw_pages/ instead")
+    sub.add_argument("--sample", action="store_true", help="scrape a random 100 courses only")
+    sub.add_argument("--delta", action="store_true",
+                     help="log changes since the previous run to course_changes.jsonl instead")
+    sub.add_argument("--full-refresh-hours", type=float, default=24,
+                     help="with --delta, re-scrape known courses in full after this many hours")
+    sub.add_argument("--parquet", action="store_true", help="also write a typed .parquet copy")
+    sub.set_defaults(run=scrape)
+
+    sub = subparsers.add_parser("download", parents=[common], help="download the QGuides listed in courses.csv")
+    sub.add_argument("--concurrency", type=int, help="upper bound on requests in flight")
+    sub.add_argument("--async", dest="use_async", action="store_true", help="use the asyncio downloader")
+    sub.add_argument("--no-store", action="store_true", help="write plain QGuides/<unique_code>.html files")
+    sub.set_defaults(run=download)
+
+    sub = subparsers.add_parser("analyze", parents=[common],
+                                help="analyze the downloaded QGuides into course_ratings.csv")
+    sub.add_argument("--no-cache", action="store_true", help="re-analyze every page")
+    sub.add_argument("--no-store", action="store_true", help="read plain QGuides/<unique_code>.html files")
+    sub.add_argument("--download", action="store_true", help="download and analyze in one pipelined run")
+    sub.add_argument("--concurrency", type=int, help="with --download, upper bound on requests in flight")
+    sub.add_argument("--queue-size", type=int, default=256,
+                     help="with --download, pages downloaded but not yet analyzed")
+    sub.add_argument("--parquet", action="store_true", help="also write a typed .parquet copy")
+    sub.set_defaults(run=analyze)
+
+    sub = subparsers.add_parser("combine", parents=[common],
+                                help="join a myHarvard term with a QGuide term into qguide_myharvard.csv")
+    sub.add_argument("--myharvard", nargs=2, metavar=("YEAR", "TERM"), help="myHarvard term, e.g. 2026 Spring")
+    sub.add_argument("--qguide", nargs=2, metavar=("YEAR", "TERM"),
+                     help="QGuide term (default: the same term a year earlier)")
+    sub.add_argument("--batch", action="store_true", help="rebuild every pairing in release/ and archive/")
+    sub.add_argument("--parquet", action="store_true", help="also write a typed .parquet copy")
+    sub.set_defaults(run=combine)
+
+    sub = subparsers.add_parser("export", parents=[common], help="write the hugems.net release JSON files")
+    sub.add_argument("--myharvard", nargs=2, metavar=("YEAR", "TERM"), required=True,
+                     help="myHarvard term, e.g. 2026 Spring")
+    sub.add_argument("--qguide", nargs=2, metavar=("YEAR", "TERM"),
+                     help="QGuide term (default: the same term a year earlier)")
+    sub.add_argument("--serializer", choices=("pandas", "orjson"), default="pandas")
+    sub.set_defaults(run=export)
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    args = build_parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Helpers shared by the qguide, myharvard and hugems scripts."""
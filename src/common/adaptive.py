@@ -0,0 +1,156 @@
+"""
+Adaptive (AIMD) concurrency limit shared by the threads talking to one server.
+
+Instead of a fixed number of workers, every request takes a slot from an
+AdaptiveLimiter. The number of slots grows while requests succeed with healthy
+latency and is cut back multiplicatively when the server throttles (429, 5xx,
+timeouts), the same additive-increase/multiplicative-decrease scheme TCP uses:
+
+- slow start: until the first sign of trouble, each success adds a slot, so the
+  limit doubles every round trip
+- congestion avoidance: afterwards each success adds 1/limit of a slot, about one
+  slot per round trip
+- on a throttled or failed request the limit is multiplied by `decrease`, at most
+  once per round trip so one burst of errors only counts once
+- a Retry-After header pauses every thread until the server said to come back
+- while the smoothed latency is above `latency_tolerance` times the fastest one
+  seen, the limit is held instead of grown
+
+Run the pool with `maximum` threads; the ones above the current limit wait.
+"""
+
+import contextlib
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Iterator, Optional
+
+from common.instrumentation import count, get_metrics
+
+# Never wait longer than this for a Retry-After
+MAX_RETRY_AFTER = 300.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delay in seconds or an HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def is_throttled(status: Optional[int]) -> bool:
+    """Whether a response status means the server is overloaded or rate limiting."""
+    return status is not None and (status == 429 or status >= 500)
+
+
+class Slot:
+    """One request's turn; record the response so the limiter can adapt."""
+
+    def __init__(self):
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+
+    def record(self, status: int, retry_after: Optional[str] = None):
+        self.status = status
+        self.retry_after = parse_retry_after(retry_after)
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64,
+                 decrease: float = 0.5, latency_tolerance: float = 3.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self.slow_start = True
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.latency: Optional[float] = None
+        self.min_latency: Optional[float] = None
+        self.peak_limit = self.limit
+        self.condition = threading.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    def acquire(self):
+        """Block until a slot is free and no Retry-After pause is in effect."""
+        start = time.perf_counter()
+        with self.condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    self.condition.wait(pause)
+                elif self.in_flight >= self.concurrency:
+                    self.condition.wait()
+                else:
+                    break
+            self.in_flight += 1
+        get_metrics().add_time("limiter_wait", time.perf_counter() - start)
+
+    def release(self, latency: float, status: Optional[int], retry_after: Optional[float] = None,
+                failed: bool = False):
+        """Give the slot back and adapt the limit to how the request went."""
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if failed or is_throttled(status):
+                self._on_congestion(now, retry_after)
+            else:
+                self._on_success(latency)
+            self.condition.notify_all()
+
+    def _on_success(self, latency: float):
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+        if self.latency > self.latency_tolerance * self.min_latency:
+            # Requests are queueing up at the server, so stop growing
+            self.slow_start = False
+            return
+        if self.slow_start:
+            self.limit += 1
+        else:
+            self.limit += 1 / self.limit
+        self.limit = min(self.limit, self.maximum)
+        self.peak_limit = max(self.peak_limit, self.limit)
+
+    def _on_congestion(self, now: float, retry_after: Optional[float]):
+        count("throttled")
+        self.slow_start = False
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        # Requests already in flight when the limit was cut report the same congestion
+        if now - self.last_decrease >= (self.latency or 0.0):
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            self.last_decrease = now
+            count("limit_decreases")
+
+    @contextlib.contextmanager
+    def slot(self) -> Iterator[Slot]:
+        """
+        Hold a slot around one request and adapt to its outcome.
+
+        Call slot.record(status, retry_after_header) once the response arrives; an
+        exception before that (timeout, connection error) counts as a failure.
+        """
+        self.acquire()
+        slot = Slot()
+        start = time.monotonic()
+        try:
+            yield slot
+        except BaseException:
+            self.release(time.monotonic() - start, slot.status, slot.retry_after,
+                         failed=slot.status is None)
+            raise
+        self.release(time.monotonic() - start, slot.status, slot.retry_after)
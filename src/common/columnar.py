@@ -0,0 +1,220 @@
+"""
+Typed Parquet copies of the CSV outputs.
+
+pd.read_csv re-infers every column's type on each load and re-parses the long
+free-text columns (descriptions, comments). Each output can also be written as a
+Parquet file next to its CSV, with an explicit type for every column, and
+read_table() loads that file instead of the CSV whenever it is present and up to date.
+
+Parquet needs pyarrow (the `parquet` extra); without it only CSV is available.
+The CSV path applies the same schema, so both paths return identical frames.
+"""
+
+import os
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+STRING = "string"
+INTEGER = "Int64"
+FLOAT = "float64"
+BOOLEAN = "boolean"
+
+SCORE_STATS = ["mean", "median", "mode", "stdev"]
+
+# Columns of the qguide release, course_ratings.csv from src/qguide/analyzer.py
+QGUIDE_SCHEMA: Dict[str, str] = {
+    "course_code": STRING,
+    "course_title": STRING,
+    "course_teacher": STRING,
+    "link": STRING,
+    "fas_code": STRING,
+    "unique_code": STRING,
+    "course_id": INTEGER,
+    "num_responded": INTEGER,
+    "num_students": INTEGER,
+    **{
+        f"{score}_{stat}": FLOAT
+        for score in ["course_score", "lecturer_score", "workload_score", "rec_score",
+                      "sentiment_score", "gem_probability"]
+        for stat in SCORE_STATS
+    },
+    "best_comment": STRING,
+    "max_sent_score": FLOAT,
+    "worse_comment": STRING,
+    "min_sent_score": FLOAT,
+    "best_gem_comment": STRING,
+    "max_gem_probability": FLOAT,
+}
+
+# Columns of the myharvard release, all_courses.csv from src/myharvard/get_all_course_data.py
+MYHARVARD_SCHEMA: Dict[str, str] = {
+    "course_title": STRING,
+    "subject_catalog": STRING,
+    "instructors": STRING,
+    "year_term": STRING,
+    "term_type": STRING,
+    "start_date": STRING,
+    "end_date": STRING,
+    "start_time": STRING,
+    "end_time": STRING,
+    "weekdays": STRING,
+    "class_number": INTEGER,
+    "course_id": INTEGER,
+    "consent": STRING,
+    # Raw page text such as "12/30", not always a number
+    "enrolled": STRING,
+    "waitlist": STRING,
+    **{
+        f"lecture_{day}": BOOLEAN
+        for day in ["sunday", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday"]
+    },
+    "description": STRING,
+    "notes": STRING,
+    "school": STRING,
+    "units": STRING,
+    "cross_registration": STRING,
+    "department": STRING,
+    "course_component": STRING,
+    "instruction_mode": STRING,
+    "grading_basis": STRING,
+    "course_requirements": STRING,
+    "general_education": STRING,
+    "quantitative_reasoning": STRING,
+    "divisional_distribution": STRING,
+}
+
+
+def combined_schema(myharvard_year, qguide_year) -> Dict[str, str]:
+    """Columns of qguide_myharvard.csv from src/hugems/combine.py."""
+    schema: Dict[str, str] = {}
+    for column, dtype in QGUIDE_SCHEMA.items():
+        if column == "course_title":
+            column = f"course_title_{qguide_year}"
+        schema[column] = dtype
+    for column, dtype in MYHARVARD_SCHEMA.items():
+        if column == "course_title":
+            column = f"course_title_{myharvard_year}"
+        schema.setdefault(column, dtype)
+    return schema
+
+
+def has_parquet() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parquet_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """Cast every column to its schema type, failing on columns the schema doesn't know."""
+    unknown = [column for column in df.columns if column not in schema]
+    if unknown:
+        raise KeyError(f"Columns missing from the schema: {unknown}")
+    columns = {}
+    for column in df.columns:
+        dtype = schema[column]
+        values = df[column]
+        if dtype in (INTEGER, FLOAT):
+            # text a page gave in place of a number (e.g. "N/A") becomes a missing value
+            numbers = pd.to_numeric(values, errors="coerce")
+            coerced = values[numbers.isna() & values.notna()]
+            if len(coerced):
+                print(f"{column}: {len(coerced)} non-numeric values read as missing, "
+                      f"e.g. {coerced.iloc[0]!r}")
+            values = numbers
+        elif dtype == BOOLEAN and values.dtype == object:
+            values = values.map({True: True, False: False, "True": True, "False": False})
+        columns[column] = values.astype(dtype)
+    return pd.DataFrame(columns, index=df.index)
+
+
+def records_frame(records: Iterable[Tuple], columns: Sequence[str],
+                  schema: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Build a frame from same-shape records (e.g. NamedTuples), one column at a time.
+
+    The records are transposed into one sequence per column, so no 2-D object array of
+    rows is built first. With a schema, each column is built directly with its type,
+    which gives the same frame as apply_schema() on the untyped one. An integer column
+    holding text such as "N/A" is kept as text instead, as the CSV had it before typing.
+    """
+    values = list(zip(*records))
+    if not values:
+        frame = pd.DataFrame(columns=list(columns))
+        return apply_schema(frame, schema) if schema else frame
+    if len(values) != len(columns):
+        raise ValueError(f"Records have {len(values)} fields, expected {len(columns)} columns")
+    if schema is None:
+        return pd.DataFrame({column: list(column_values) for column, column_values in zip(columns, values)})
+
+    unknown = [column for column in columns if column not in schema]
+    if unknown:
+        raise KeyError(f"Columns missing from the schema: {unknown}")
+    typed = {}
+    for column, column_values in zip(columns, values):
+        dtype = schema[column]
+        if dtype == FLOAT:
+            typed[column] = np.array(column_values, dtype=np.float64)
+        elif dtype == INTEGER:
+            try:
+                # through float64, which also parses numeric strings and turns None into a missing value
+                typed[column] = pd.array(np.array(column_values, dtype=np.float64), dtype=INTEGER)
+            except (TypeError, ValueError):
+                # a page gave something other than a whole number (e.g. "N/A"); the raw
+                # values are kept so the CSV still shows what the page said
+                print(f"{column}: non-integer values, kept as text")
+                typed[column] = pd.Series(column_values, dtype=object)
+        else:
+            typed[column] = pd.array(column_values, dtype=dtype)
+    return pd.DataFrame(typed)
+
+
+def check_formats(formats: Iterable[str]):
+    """Fail early on unknown output formats, or Parquet without pyarrow."""
+    unknown = [fmt for fmt in formats if fmt not in ("csv", "parquet")]
+    if unknown:
+        raise ValueError(f"Unknown output formats: {unknown}")
+    if "parquet" in formats and not has_parquet():
+        raise ImportError("Writing Parquet needs pyarrow, install the `parquet` extra")
+
+
+def write_table(df: pd.DataFrame, csv_path: str, schema: Dict[str, str],
+                formats: Iterable[str] = ("csv",)):
+    """Write df as CSV and/or as typed Parquet next to it."""
+    formats = list(formats)
+    check_formats(formats)
+    if "csv" in formats:
+        df.to_csv(csv_path, index=False)
+    if "parquet" in formats:
+        apply_schema(df, schema).to_parquet(parquet_path(csv_path), index=False)
+
+
+def read_csv_typed(csv_path: str, schema: Dict[str, str]) -> pd.DataFrame:
+    """Read a CSV with the schema's column types."""
+    # Read text columns as text so values like "0042" are not turned into numbers
+    string_columns = {column: str for column, dtype in schema.items() if dtype == STRING}
+    return apply_schema(pd.read_csv(csv_path, dtype=string_columns), schema)
+
+
+def csv_to_parquet(csv_path: str, schema: Dict[str, str]):
+    """Write the typed Parquet copy of an existing CSV."""
+    write_table(read_csv_typed(csv_path, schema), csv_path, schema, ["parquet"])
+
+
+def read_table(csv_path: str, schema: Dict[str, str]) -> pd.DataFrame:
+    """
+    Load an output, preferring its Parquet copy when it is at least as new as the CSV.
+
+    Either way the columns come back with the schema's types.
+    """
+    path = parquet_path(csv_path)
+    if (has_parquet() and os.path.exists(path)
+            and (not os.path.exists(csv_path) or os.path.getmtime(path) >= os.path.getmtime(csv_path))):
+        return pd.read_parquet(path)
+    return read_csv_typed(csv_path, schema)
@@ -0,0 +1,179 @@
+"""
+Lightweight timers and counters for the pipelines.
+
+Code under measurement wraps a stage in `with timer("network"):` and bumps counters
+with `count("bytes", len(body))`. Both go to the process-wide metrics, which the
+script writes out at the end as a JSON run summary (write_summary) next to its
+other outputs. Timers add up the time of every call, so with several threads a
+stage can report more seconds than the run's wall time; the per-call mean is what
+to compare when tuning concurrency.
+
+Set PIPELINE_PROFILE=cprofile (or pyinstrument, if installed) to also profile the
+whole run with profiled().
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+
+class Metrics:
+    """Thread-safe accumulated timings and counters."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timers: Dict[str, list] = {}
+        self.counters: Dict[str, float] = {}
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+
+    def add_time(self, name: str, seconds: float, calls: int = 1):
+        with self.lock:
+            total = self.timers.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += calls
+
+    def count(self, name: str, value: float = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextlib.contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain-data copy of the metrics, e.g. to send back from a worker process."""
+        with self.lock:
+            return {
+                "timers": {name: list(total) for name, total in self.timers.items()},
+                "counters": dict(self.counters),
+            }
+
+    def merge(self, snapshot: Dict[str, Any]):
+        """Add the metrics of a snapshot (from another process or collect()) to these."""
+        for name, (seconds, calls) in snapshot["timers"].items():
+            self.add_time(name, seconds, calls)
+        for name, value in snapshot["counters"].items():
+            self.count(name, value)
+
+    def summary(self, **extra: Any) -> Dict[str, Any]:
+        """Run summary with the wall time, every timer and counter, and any extra fields."""
+        snapshot = self.snapshot()
+        return {
+            **extra,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "wall_seconds": round(time.perf_counter() - self.start, 3),
+            "timers": {
+                name: {
+                    "seconds": round(seconds, 4),
+                    "calls": calls,
+                    "mean_ms": round(1000 * seconds / calls, 3) if calls else None,
+                }
+                for name, (seconds, calls) in sorted(snapshot["timers"].items())
+            },
+            "counters": dict(sorted(snapshot["counters"].items())),
+        }
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+def timer(name: str):
+    """Time a block into the process-wide metrics."""
+    return _metrics.timer(name)
+
+
+def count(name: str, value: float = 1):
+    """Add to a process-wide counter."""
+    _metrics.count(name, value)
+
+
+@contextlib.contextmanager
+def collect() -> Iterator[Metrics]:
+    """
+    Send everything recorded inside the block to a fresh Metrics instead.
+
+    Used around work whose metrics are handed back separately, like a shard analyzed
+    in a worker process, so it isn't counted twice when it runs in-process.
+    """
+    global _metrics
+    previous, _metrics = _metrics, Metrics()
+    try:
+        yield _metrics
+    finally:
+        _metrics = previous
+
+
+def write_summary(name: str, path: Optional[str] = None, **extra: Any) -> Dict[str, Any]:
+    """Write the process-wide metrics to run_summary_<name>.json and print the timers."""
+    summary = _metrics.summary(pipeline=name, **extra)
+    path = path or f"run_summary_{name}.json"
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n{name} run summary ({summary['wall_seconds']:.1f}s wall), saved to {path}")
+    for stage, total in summary["timers"].items():
+        print(f"  {stage:<16} {total['seconds']:10.2f}s  {total['calls']:>8} calls  "
+              f"{total['mean_ms']:10.2f} ms/call")
+    for counter, value in summary["counters"].items():
+        print(f"  {counter:<16} {value:>14,}")
+    return summary
+
+
+@contextlib.contextmanager
+def profiled(name: str, mode: Optional[str] = None) -> Iterator[None]:
+    """
+    Profile the block with cProfile or pyinstrument, per mode or PIPELINE_PROFILE.
+
+    cProfile stats are saved to <name>.prof (open with pstats or snakeviz) and the top
+    functions are printed; pyinstrument writes <name>.profile.html.
+    """
+    mode = mode if mode is not None else os.environ.get("PIPELINE_PROFILE")
+    if not mode:
+        yield
+        return
+
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{name}.prof")
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(20)
+            print(out.getvalue())
+            print(f"Profile saved to {name}.prof")
+    elif mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ImportError("PIPELINE_PROFILE=pyinstrument needs pyinstrument installed")
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(f"{name}.profile.html", "w") as f:
+                f.write(profiler.output_html())
+            print(profiler.output_text())
+            print(f"Profile saved to {name}.profile.html")
+    else:
+        raise ValueError(f"Unknown profiler {mode!r}, use cprofile or pyinstrument")
@@ -0,0 +1,168 @@
+"""
+Content-addressed store of raw downloaded pages.
+
+Every page is saved once, compressed, under the sha256 of its bytes:
+
+    <root>/objects/ab/abcdef....html.gz
+
+and an append-only index (<root>/index.jsonl, later lines win) maps each key, a
+QGuide unique_code or a course URL, to the hash of the page last stored for it.
+Identical pages share one blob, and a page that changed keeps its old blob, so
+earlier versions can still be found from older index lines.
+
+Pages are gzip-compressed by default, or zstd-compressed with compression="zstd"
+when the zstandard package is installed. Reading them back needs no network, so
+the parsers can be re-run offline from the store alone.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+EXTENSIONS = {"gzip": ".html.gz", "zstd": ".html.zst"}
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('compression="zstd" needs zstandard installed, or use "gzip"')
+    return zstandard
+
+
+class PageStore:
+    def __init__(self, root: str = "raw_pages", compression: str = "gzip", level: Optional[int] = None):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unknown compression {compression!r}, use gzip or zstd")
+        if compression == "zstd":
+            _zstd()
+        self.root = root
+        self.compression = compression
+        self.level = level
+        self.index_path = os.path.join(root, "index.jsonl")
+        self.entries: Dict[str, dict] = {}
+        # Shared by the scraper threads
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash can cut the last line short
+                        continue
+                    self.entries[entry["key"]] = entry
+
+    def blob_path(self, sha256: str, compression: str) -> str:
+        return os.path.join(self.root, "objects", sha256[:2], sha256 + EXTENSIONS[compression])
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.compression == "zstd":
+            return _zstd().ZstdCompressor(level=self.level or 10).compress(data)
+        return gzip.compress(data, compresslevel=self.level or 9, mtime=0)
+
+    def put(self, key: str, page: str) -> str:
+        """Store a page under key and return its sha256; the blob is only written if new."""
+        return self.put_bytes(key, page.encode("utf-8"))
+
+    def put_bytes(self, key: str, data: bytes) -> str:
+        sha256 = hashlib.sha256(data).hexdigest()
+        entry = self.entries.get(key)
+        if entry and entry["sha256"] == sha256:
+            return sha256
+
+        path = self.blob_path(sha256, self.compression)
+        if os.path.exists(path):
+            stored_bytes = os.path.getsize(path)
+        else:
+            blob = self._compress(data)
+            stored_bytes = len(blob)
+            # Written to a temp file and renamed into place, so a crash never leaves a
+            # truncated blob behind and two threads storing the same page don't clash
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(blob)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        entry = {
+            "key": key,
+            "sha256": sha256,
+            "compression": self.compression,
+            "bytes": len(data),
+            "stored_bytes": stored_bytes,
+            "stored_at": time.time(),
+        }
+        with self.lock:
+            self.entries[key] = entry
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return sha256
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """Raw bytes of the page last stored under key, or None."""
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        with open(self.blob_path(entry["sha256"], entry["compression"]), "rb") as f:
+            blob = f.read()
+        if entry["compression"] == "zstd":
+            return _zstd().ZstdDecompressor().decompress(blob)
+        return gzip.decompress(blob)
+
+    def get(self, key: str) -> Optional[str]:
+        """The page last stored under key, decoded like open(path).read() would, or None."""
+        data = self.get_bytes(key)
+        if data is None:
+            return None
+        # Universal newlines, so parsers see the same text as from the plain .html file
+        return io.TextIOWrapper(io.BytesIO(data), encoding="utf-8").read()
+
+    def digest(self, key: str) -> Optional[str]:
+        """sha256 of the page's raw bytes, without reading it."""
+        entry = self.entries.get(key)
+        return entry["sha256"] if entry else None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def keys(self) -> Iterator[str]:
+        return iter(list(self.entries))
+
+    def import_folder(self, folder: str, suffix: str = ".html") -> int:
+        """Store every <key><suffix> file in folder under its key; returns how many were read."""
+        names = [name for name in sorted(os.listdir(folder)) if name.endswith(suffix)]
+        for name in names:
+            with open(os.path.join(folder, name), "rb") as f:
+                self.put_bytes(name[:-len(suffix)], f.read())
+        return len(names)
+
+    def stats(self) -> Tuple[int, int, int]:
+        """Number of keys, their total page size and the size of the distinct blobs on disk."""
+        blobs = {(entry["sha256"], entry["compression"]): entry["stored_bytes"]
+                 for entry in self.entries.values()}
+        return (len(self.entries), sum(entry["bytes"] for entry in self.entries.values()),
+                sum(blobs.values()))
+
+    def items(self, keys: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, str]]:
+        """(key, page) for the given keys, or every key in the store."""
+        for key in (self.keys() if keys is None else keys):
+            page = self.get(key)
+            if page is not None:
+                yield key, page
@@ -0,0 +1,37 @@
+"""
+HTML parser backends shared by the scrapers.
+
+BeautifulSoup can sit on top of different tree builders. lxml is several times faster
+than Python's built-in html.parser, so it is used whenever it is installed, with
+html.parser kept as the fallback. Set HTML_PARSER_BACKEND to force one of them.
+"""
+
+import os
+from typing import Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+FAST_BACKEND = "lxml"
+FALLBACK_BACKEND = "html.parser"
+
+
+def _default_backend() -> str:
+    forced = os.environ.get("HTML_PARSER_BACKEND")
+    if forced:
+        return forced
+    try:
+        import lxml  # noqa: F401
+    except ImportError:
+        return FALLBACK_BACKEND
+    return FAST_BACKEND
+
+
+DEFAULT_BACKEND = _default_backend()
+
+
+def make_soup(markup, backend=None, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """Parse markup with the given backend, or the fastest one available.
+
+    With parse_only, only the matching elements are built into the tree.
+    """
+    return BeautifulSoup(markup, backend or DEFAULT_BACKEND, parse_only=parse_only)
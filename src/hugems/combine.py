@@ -1,61 +1,191 @@
 import pandas as pd
 import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
 
-def combine_csv_files(myharvard_year, myharvard_term, qguide_year, qguide_term):
-    # Get the repository root directory (assuming this script is in src/hugems)
-    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-    
-    # Define input and output paths relative to repo root
-    qguide_path = os.path.join(repo_root, "release", "qguide", f"{qguide_year}_{qguide_term}.csv")
-    myharvard_path = os.path.join(repo_root, "release", "myharvard", f"{myharvard_year}_{myharvard_term}.csv")
-    folder_name = f"{myharvard_year}_{myharvard_term}_{qguide_year}_{qguide_term}"
-    output_dir = os.path.join(repo_root, "release", "hugems", folder_name)
-    
-    
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Extract years and terms from input filenames
-    myharvard_year_term = f"{myharvard_year}_{myharvard_term}"
-    qguide_year_term = f"{qguide_year}_{qguide_term}"
-    
-    # Read the CSV files
-    qguide_df = pd.read_csv(qguide_path)
-    qguide_df = qguide_df.drop_duplicates(subset=['unique_code'])
-    myharvard_df = pd.read_csv(myharvard_path)
-    
-    # Perform a left merge to keep all QGuide entries (including duplicates)
-    # and match with MyHarvard data where possible
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.columnar import (  # noqa: E402
+    MYHARVARD_SCHEMA, QGUIDE_SCHEMA, check_formats, combined_schema, read_table, write_table
+)
+
+# Get the repository root directory (assuming this script is in src/hugems)
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Term files are named YEAR_TERM.csv, e.g. 2026_Spring.csv (some releases use a lowercase term)
+TERM_FILE = re.compile(r'^(\d{4})_(spring|fall)\.csv$', re.IGNORECASE)
+
+SCHEMAS = {"qguide": QGUIDE_SCHEMA, "myharvard": MYHARVARD_SCHEMA}
+
+
+def find_term_files(source, repo_root=REPO_ROOT):
+    # Map (year, term) to the CSV path of every term file of source ("qguide" or "myharvard")
+    # under release/<source> and archive/*/<source>; release wins over archive
+    folders = sorted(glob(os.path.join(repo_root, "archive", "*", source)))
+    folders.append(os.path.join(repo_root, "release", source))
+    files = {}
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            match = TERM_FILE.match(filename)
+            if match:
+                files[(match.group(1), match.group(2).capitalize())] = os.path.join(folder, filename)
+    return files
+
+
+def default_pairings(myharvard_files, qguide_files):
+    # hugems.net pairs the myHarvard offerings of a term with the QGuide of the same term a year earlier
+    pairings = []
+    for year, term in sorted(myharvard_files):
+        qguide_key = (str(int(year) - 1), term)
+        if qguide_key in qguide_files:
+            pairings.append(((year, term), qguide_key))
+    return pairings
+
+
+def combine_frames(qguide_df, myharvard_df, myharvard_year, qguide_year):
+    # Perform an inner merge to keep the QGuide entries with a matching myHarvard course
     # The only duplicate column should only be course_title
     # which can change over the years
-    combined_df = pd.merge(
+    return pd.merge(
         qguide_df,
         myharvard_df,
         on='course_id',
         how='inner',
         suffixes=(f'_{qguide_year}', f'_{myharvard_year}')
     )
-    
+
+
+def load_term(source, path):
+    df = read_table(path, SCHEMAS[source])
+    if source == "qguide":
+        df = df.drop_duplicates(subset=['unique_code'])
+    return df
+
+
+def inferred_csv_frame(df):
+    # The published CSVs were written from untyped reads, where pandas turned every
+    # text column holding only numbers into numbers (myHarvard's waitlist "0" became "0.0")
+    # The CSV keeps doing that so it stays byte-for-byte the same; Parquet keeps the text
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == "string":
+            numbers = pd.to_numeric(values.astype(object), errors="coerce")
+            if values.notna().any() and (numbers.notna() == values.notna()).all():
+                values = numbers
+        columns[column] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+def save_combined(combined_df, myharvard_path, myharvard_key, qguide_key, output_formats):
+    # The combined release goes to the hugems folder next to the myHarvard input,
+    # i.e. release/hugems for the current release and archive/<term>/hugems for archived terms
+    (myharvard_year, myharvard_term), (qguide_year, qguide_term) = myharvard_key, qguide_key
+    folder_name = f"{myharvard_year}_{myharvard_term}_{qguide_year}_{qguide_term}"
+    release_root = os.path.dirname(os.path.dirname(myharvard_path))
+    output_dir = os.path.join(release_root, "hugems", folder_name)
+    # Create output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, "qguide_myharvard.csv")
+    schema = combined_schema(myharvard_year, qguide_year)
+    if "csv" in output_formats:
+        write_table(inferred_csv_frame(combined_df), output_path, schema, ["csv"])
+    if "parquet" in output_formats:
+        write_table(combined_df, output_path, schema, ["parquet"])
+    return output_path
+
+
+def term_path(files, source, year, term):
+    path = files.get((str(year), term.capitalize()))
+    if path is None:
+        raise FileNotFoundError(f"No {source} CSV for {year} {term} in release/{source} or archive/*/{source}")
+    return path
+
+
+def combine_csv_files(myharvard_year, myharvard_term, qguide_year, qguide_term, output_formats=("csv",)):
+    # Inputs are read from their typed Parquet copies when present (see src/common/columnar.py)
+    # Add "parquet" to output_formats to also write a typed qguide_myharvard.parquet
+    check_formats(output_formats)
+
+    # Find the input CSVs in release/ (or archive/ for older terms)
+    qguide_path = term_path(find_term_files("qguide"), "qguide", qguide_year, qguide_term)
+    myharvard_path = term_path(find_term_files("myharvard"), "myharvard", myharvard_year, myharvard_term)
+
+    # Read the CSV files
+    qguide_df = load_term("qguide", qguide_path)
+    myharvard_df = load_term("myharvard", myharvard_path)
+
+    combined_df = combine_frames(qguide_df, myharvard_df, myharvard_year, qguide_year)
+
     # Save the combined dataset
-    output_filename = "qguide_myharvard.csv"
-    output_path = os.path.join(output_dir, output_filename)
-    combined_df.to_csv(output_path, index=False)
+    output_path = save_combined(combined_df, myharvard_path,
+                                (str(myharvard_year), myharvard_term.capitalize()),
+                                (str(qguide_year), qguide_term.capitalize()), output_formats)
     print(f"Combined CSV saved to: {output_path}")
     print(f"Total rows in combined file: {len(combined_df)}")
-    print(f"Rows from QGuide 2024: {len(qguide_df)}")
-    print(f"Rows from MyHarvard 2025: {len(myharvard_df)}")
+    print(f"Rows from QGuide {qguide_year}: {len(qguide_df)}")
+    print(f"Rows from MyHarvard {myharvard_year}: {len(myharvard_df)}")
     print(f"Rows with matches: {len(combined_df)}")
 
+
+def combine_batch(pairings=None, workers=1, output_formats=("csv",), repo_root=REPO_ROOT):
+    # Build several pairings in one run; each term file is read once and shared by every
+    # pairing that uses it
+    # pairings is a list of ((myharvard_year, myharvard_term), (qguide_year, qguide_term)),
+    # by default every myHarvard term whose QGuide from a year earlier is available
+    check_formats(output_formats)
+    files = {source: find_term_files(source, repo_root) for source in SCHEMAS}
+    if pairings is None:
+        pairings = default_pairings(files["myharvard"], files["qguide"])
+    pairings = [((str(m_year), m_term.capitalize()), (str(q_year), q_term.capitalize()))
+                for (m_year, m_term), (q_year, q_term) in pairings]
+
+    # Load every term needed by the pairings exactly once
+    paths = {}
+    for myharvard_key, qguide_key in pairings:
+        paths[("myharvard", myharvard_key)] = term_path(files["myharvard"], "myharvard", *myharvard_key)
+        paths[("qguide", qguide_key)] = term_path(files["qguide"], "qguide", *qguide_key)
+    frames = {key: load_term(key[0], path) for key, path in paths.items()}
+
+    def combine_pair(pairing):
+        myharvard_key, qguide_key = pairing
+        combined_df = combine_frames(frames[("qguide", qguide_key)], frames[("myharvard", myharvard_key)],
+                                     myharvard_key[0], qguide_key[0])
+        output_path = save_combined(combined_df, paths[("myharvard", myharvard_key)],
+                                    myharvard_key, qguide_key, output_formats)
+        return output_path, len(combined_df)
+
+    # The frames are shared read-only, so threads can work on several pairings at once
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(combine_pair, pairings))
+
+    for (myharvard_key, qguide_key), (output_path, rows) in zip(pairings, results):
+        print(f"myHarvard {' '.join(myharvard_key)} + QGuide {' '.join(qguide_key)}: "
+              f"{rows} rows saved to {output_path}")
+    return [output_path for output_path, _ in results]
+
+
 if __name__ == "__main__":
+    # Set batch = True to rebuild every pairing found in release/ and archive/ in one run
+    # (each myHarvard term with the QGuide of the same term a year earlier)
+    batch = False
+    workers = 4
+
     # Specify years and terms
     myharvard_year = "2026"
     myharvard_term = "Spring"
     qguide_year = "2025"
     qguide_term = "Spring"
-    
-    combine_csv_files(
-        myharvard_year=myharvard_year,
-        myharvard_term=myharvard_term,
-        qguide_year=qguide_year,
-        qguide_term=qguide_term
-    )
\ No newline at end of file
+
+    if batch:
+        combine_batch(workers=workers)
+    else:
+        combine_csv_files(
+            myharvard_year=myharvard_year,
+            myharvard_term=myharvard_term,
+            qguide_year=qguide_year,
+            qguide_term=qguide_term
+        )
@@ -0,0 +1,301 @@
+# SQLite index of every QGuide and myHarvard term file in release/ and archive/,
+# and of the QGuide ratings of the older archived terms (archive/<term>/course_ratings.csv)
+# rows are indexed on course_id, subject catalog, instructor and term, so looking up
+# the QGuide history of a course or everything taught by someone doesn't need to
+# reload and join the CSVs
+# the index is updated incrementally: a term file is only re-read when its content changed
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from combine import REPO_ROOT, SCHEMAS, TERM_FILE, find_term_files  # noqa: E402
+from common.columnar import FLOAT, INTEGER, QGUIDE_SCHEMA, STRING, apply_schema, read_table  # noqa: E402
+
+# Spring comes before Fall within a calendar year
+TERM_ORDER = {"Spring": 1, "Fall": 2}
+
+# Columns copied out of each row so they can be indexed; the full row is kept as JSON
+# QGuide rows only name the instructor's last name (course_teacher), myHarvard rows list
+# full names separated by commas (instructors)
+INDEXED_COLUMNS = {
+    "qguide": {"subject_catalog": "course_code", "course_title": "course_title",
+               "instructors": "course_teacher"},
+    "myharvard": {"subject_catalog": "subject_catalog", "course_title": "course_title",
+                  "instructors": "instructors"},
+}
+
+
+# Archived terms are folders named after the hugems release, e.g. archive/fall_2023, whose
+# course_ratings.csv holds the QGuide a year earlier (Fall 2022, codes FAS-<course_id>-2228-...)
+# spring_2024 only kept verbose_course_ratings.csv, the ratings joined with myHarvard columns
+ARCHIVE_FOLDER = re.compile(r"^(spring|fall)_(\d{4})$", re.IGNORECASE)
+ARCHIVE_RATINGS = ("course_ratings.csv", "verbose_course_ratings.csv")
+
+# Ratings from before gem probabilities were computed have a gem score instead;
+# columns outside this schema (the myHarvard ones of the verbose files) aren't indexed
+ARCHIVE_SCHEMA = {
+    **QGUIDE_SCHEMA,
+    **{f"gem_score_{stat}": FLOAT for stat in ["mean", "median", "mode", "stdev"]},
+    "max_gem_score": FLOAT,
+}
+
+
+def find_archived_ratings(repo_root=REPO_ROOT):
+    # Map (year, term) of the QGuide to the course ratings CSV of every archived term
+    files = {}
+    for folder in sorted(os.listdir(os.path.join(repo_root, "archive"))):
+        match = ARCHIVE_FOLDER.match(folder)
+        if not match:
+            continue
+        for filename in ARCHIVE_RATINGS:
+            path = os.path.join(repo_root, "archive", folder, filename)
+            if os.path.isfile(path):
+                files[(str(int(match.group(2)) - 1), match.group(1).capitalize())] = path
+                break
+    return files
+
+
+def load_archived_ratings(path):
+    # Older ratings have no course_id column, it's the second part of the unique code
+    string_columns = {column: str for column, dtype in ARCHIVE_SCHEMA.items() if dtype == STRING}
+    df = pd.read_csv(path, dtype=string_columns, usecols=lambda column: column in ARCHIVE_SCHEMA)
+    df = apply_schema(df, ARCHIVE_SCHEMA)
+    if "course_id" not in df.columns:
+        course_ids = pd.to_numeric(df["unique_code"].str.split("-").str[1], errors="coerce")
+        df.insert(df.columns.get_loc("unique_code") + 1, "course_id", course_ids.astype(INTEGER))
+    return df
+
+
+def load_term_file(source, path):
+    # A YEAR_TERM.csv term file, or the ratings of an archived term
+    if TERM_FILE.match(os.path.basename(path)):
+        return read_table(path, SCHEMAS[source])
+    return load_archived_ratings(path)
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def normalize_catalog(subject_catalog):
+    # "AC  512M" -> "AC 512M", "compsci 50" -> "COMPSCI 50"
+    return " ".join(str(subject_catalog).split()).upper()
+
+
+def normalize_name(name):
+    return " ".join(str(name).split()).lower()
+
+
+def split_instructors(source, value):
+    # (name, last_name) of each instructor named in a row
+    if value is None:
+        return []
+    if source == "qguide":
+        name = normalize_name(value)
+        return [(name, name)] if name else []
+    names = [normalize_name(name) for name in re.split(r"[,;]", value)]
+    return [(name, name.split()[-1]) for name in names if name]
+
+
+class CourseIndex:
+    # a courses table with a row per QGuide or myHarvard entry of each indexed term,
+    # an instructors table linking names to those rows, and the digest of every
+    # term file so unchanged files are skipped on the next update
+
+    def __init__(self, path=os.path.join(REPO_ROOT, "course_index.sqlite")):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS term_files (
+                source TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                term TEXT NOT NULL,
+                path TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                indexed_at REAL NOT NULL,
+                PRIMARY KEY (source, year, term)
+            );
+            CREATE TABLE IF NOT EXISTS courses (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                term TEXT NOT NULL,
+                term_order INTEGER NOT NULL,
+                course_id INTEGER,
+                subject_catalog TEXT,
+                course_title TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS instructors (
+                course_row INTEGER NOT NULL REFERENCES courses (id),
+                source TEXT NOT NULL,
+                name TEXT NOT NULL,
+                last_name TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS courses_course_id ON courses (course_id);
+            CREATE INDEX IF NOT EXISTS courses_subject_catalog ON courses (subject_catalog);
+            CREATE INDEX IF NOT EXISTS courses_term ON courses (source, year, term);
+            CREATE INDEX IF NOT EXISTS instructors_name ON instructors (name);
+            CREATE INDEX IF NOT EXISTS instructors_last_name ON instructors (last_name);
+            CREATE INDEX IF NOT EXISTS instructors_course_row ON instructors (course_row);
+            """
+        )
+        self.conn.commit()
+
+    def ingest(self, source, year, term, path, force=False):
+        # (re)index one term file, returning the number of rows indexed,
+        # or None when the file is unchanged since it was last indexed
+        year, term = int(year), term.capitalize()
+        digest = file_digest(path)
+        indexed = self.conn.execute(
+            "SELECT digest FROM term_files WHERE source = ? AND year = ? AND term = ?",
+            (source, year, term),
+        ).fetchone()
+        if indexed and indexed[0] == digest and not force:
+            return None
+
+        df = load_term_file(source, path)
+        columns = INDEXED_COLUMNS[source]
+        # to_json turns missing values into null, which json.dumps of the frame values would not
+        records = df.to_json(orient="records", lines=True).splitlines()
+
+        with self.conn:
+            self.drop_term(source, year, term)
+            for record in records:
+                row = json.loads(record)
+                subject_catalog = row.get(columns["subject_catalog"])
+                cursor = self.conn.execute(
+                    "INSERT INTO courses (source, year, term, term_order, course_id, subject_catalog,"
+                    " course_title, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (source, year, term, TERM_ORDER[term], row.get("course_id"),
+                     normalize_catalog(subject_catalog) if subject_catalog else None,
+                     row.get(columns["course_title"]), record),
+                )
+                self.conn.executemany(
+                    "INSERT INTO instructors VALUES (?, ?, ?, ?)",
+                    [(cursor.lastrowid, source, name, last_name)
+                     for name, last_name in split_instructors(source, row.get(columns["instructors"]))],
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO term_files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, year, term, os.path.abspath(path), digest, len(records), time.time()),
+            )
+        return len(records)
+
+    def drop_term(self, source, year, term):
+        self.conn.execute(
+            "DELETE FROM instructors WHERE course_row IN"
+            " (SELECT id FROM courses WHERE source = ? AND year = ? AND term = ?)",
+            (source, year, term),
+        )
+        self.conn.execute(
+            "DELETE FROM courses WHERE source = ? AND year = ? AND term = ?",
+            (source, year, term),
+        )
+        self.conn.execute(
+            "DELETE FROM term_files WHERE source = ? AND year = ? AND term = ?",
+            (source, year, term),
+        )
+
+    def update(self, repo_root=REPO_ROOT, force=False):
+        # index every term file under release/ and archive/, and the ratings of the
+        # archived terms without one, skipping unchanged files, and drop terms whose
+        # file is gone; returns {(source, year, term): rows} of the files that were (re)indexed
+        updated = {}
+        for source in SCHEMAS:
+            files = find_term_files(source, repo_root)
+            if source == "qguide":
+                # a term file wins over the archived ratings of the same term
+                files = {**find_archived_ratings(repo_root), **files}
+            for (year, term), path in sorted(files.items()):
+                rows = self.ingest(source, year, term, path, force)
+                if rows is not None:
+                    updated[(source, int(year), term)] = rows
+            present = {(int(year), term) for year, term in files}
+            for year, term in self.terms(source):
+                if (year, term) not in present:
+                    with self.conn:
+                        self.drop_term(source, year, term)
+        return updated
+
+    def terms(self, source):
+        return [(year, term) for year, term in self.conn.execute(
+            "SELECT year, term FROM term_files WHERE source = ? ORDER BY year, term", (source,))]
+
+    def _rows(self, where, params, source=None):
+        # full rows matching a condition on courses (aliased c), oldest term first,
+        # with the source, year and term they come from
+        if source is not None:
+            where = f"({where}) AND c.source = ?"
+            params = (*params, source)
+        cursor = self.conn.execute(
+            f"SELECT c.source, c.year, c.term, c.data FROM courses c WHERE {where}"
+            " ORDER BY c.year, c.term_order, c.source, c.id",
+            params,
+        )
+        return [{"source": row_source, "year": year, "term": term, **json.loads(data)}
+                for row_source, year, term, data in cursor]
+
+    def course_history(self, course_id, source=None):
+        # every QGuide and myHarvard entry of a course, across all indexed terms
+        return self._rows("c.course_id = ?", (int(course_id),), source)
+
+    def qguide_history(self, course_id):
+        return self.course_history(course_id, "qguide")
+
+    def by_subject_catalog(self, subject_catalog, source=None):
+        # entries of a subject catalog such as "COMPSCI 50"; myHarvard section
+        # suffixes (e.g. "ADV 9504 001" for "ADV 9504") match too
+        catalog = normalize_catalog(subject_catalog)
+        # "X " < subject_catalog < "X!" is an index range scan for the "X <section>" entries
+        return self._rows("c.subject_catalog = ? OR (c.subject_catalog > ? AND c.subject_catalog < ?)",
+                          (catalog, catalog + " ", catalog + "!"), source)
+
+    def by_instructor(self, name, source=None):
+        # entries taught by an instructor; a full name like "Martin Bechthold" matches
+        # myHarvard's full names and the QGuide's last names ("Bechthold"), a single
+        # name matches either full or last names
+        name = normalize_name(name)
+        words = name.split()
+        # last names can have several words ("Mangabeira Unger"), so try every suffix
+        suffixes = [" ".join(words[i:]) for i in range(len(words))]
+        placeholders = ", ".join("?" * len(suffixes))
+        return self._rows(
+            "c.id IN (SELECT course_row FROM instructors WHERE"
+            " (source = 'myharvard' AND (name = ? OR last_name = ?))"
+            f" OR (source = 'qguide' AND name IN ({placeholders})))",
+            (name, name, *suffixes), source,
+        )
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    index = CourseIndex()
+    start_time = time.time()
+    updated = index.update()
+    for (source, year, term), rows in updated.items():
+        print(f"Indexed {rows} {source} rows for {year} {term}")
+    print(f"Index up to date in {time.time() - start_time:.1f}s "
+          f"({len(updated)} term files re-indexed)")
+
+    # demo
+    # for row in index.qguide_history(108465):
+    #     print(row["year"], row["term"], row["course_code"], row["course_score_mean"])
+    # for row in index.by_instructor("David Malan"):
+    #     print(row["source"], row["year"], row["term"], row.get("course_code") or row.get("subject_catalog"))
+    index.close()
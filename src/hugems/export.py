@@ -0,0 +1,251 @@
+# Write the hugems.net release JSON files from qguide_myharvard.csv, the same files
+# course_ratings_analysis.ipynb exports:
+# super_gems.json, great_courses.json, hidden_gems.json, department_list.json and
+# departments/<department>.json with the top 5 gems of each department
+# The shared filters are computed once, every department comes out of one groupby
+# pass, and the files are serialized and written in parallel. A file whose content
+# hash is unchanged is not rewritten, so republishing only touches what changed
+
+import functools
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import nltk
+import numpy
+import pandas as pd
+from nltk import tokenize
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from combine import REPO_ROOT  # noqa: E402
+from common.columnar import combined_schema, read_table  # noqa: E402
+
+# Gem listings show at most this many courses per department
+DEPARTMENT_TOP = 5
+
+_sia = None
+
+
+def gem_columns(myharvard_year):
+    return [
+        'course_code',
+        f'course_title_{myharvard_year}',
+        'course_score_mean',
+        'rec_score_mean',
+        'gem_probability_mean',
+        'sentiment_score_median',
+        'best_gem_comment',
+        'workload_score_mean',
+        'best_gem_comment_short',
+        'course_id',
+        'link',
+    ]
+
+
+def comment_columns(myharvard_year):
+    # great and hidden courses also show their best comment
+    columns = gem_columns(myharvard_year)
+    return columns[:-2] + ['best_comment', 'best_comment_short', 'best_comment_first'] + columns[-2:]
+
+
+def ensure_nltk_data():
+    # the comment helpers split sentences with punkt and score them with VADER, which
+    # NLTK keeps outside the package; download whichever is missing, as the notebook did
+    for resource, package in [('tokenizers/punkt', 'punkt'), ('sentiment/vader_lexicon.zip', 'vader_lexicon')]:
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            if not nltk.download(package, quiet=True):
+                raise LookupError(f"NLTK's {package} data is missing and could not be downloaded, "
+                                  f"install it with: python -m nltk.downloader {package}")
+
+
+# the comment helpers are memoized, since the same comment can show up in several files
+@functools.lru_cache(maxsize=None)
+def get_short_gem_comment(comment):
+    # the sentence of the comment that calls the course a gem
+    if comment == '':
+        return ''
+    for sentence in tokenize.sent_tokenize(comment):
+        if re.search(r'\bgem\b', sentence.lower()):
+            return sentence
+    assert False
+
+
+@functools.lru_cache(maxsize=None)
+def get_short_comment(comment):
+    # the most positive sentence of the comment
+    global _sia
+    if comment == '':
+        return ''
+    if _sia is None:
+        from nltk.sentiment import SentimentIntensityAnalyzer
+        _sia = SentimentIntensityAnalyzer()
+    max_score = 0
+    best_short_comment = ''
+    for sentence in tokenize.sent_tokenize(comment):
+        score = _sia.polarity_scores(sentence)['compound']
+        if score > max_score:
+            max_score = score
+            best_short_comment = sentence
+    return best_short_comment
+
+
+@functools.lru_cache(maxsize=None)
+def get_first_sentence(comment):
+    if comment == '':
+        return ''
+    return tokenize.sent_tokenize(comment)[0]
+
+
+def prepare(df, myharvard_year):
+    # one row per course code and title, with the comments filled in
+    df = df.copy()
+    df['course_id'] = df['course_id'].astype(str)
+    df['course_identifier'] = df['course_code'] + ' ' + df[f'course_title_{myharvard_year}']
+    df = df.drop_duplicates(subset='course_identifier', keep="first")
+    df['best_gem_comment'] = df['best_gem_comment'].fillna('')
+    df['best_comment'] = df['best_comment'].fillna('')
+    return df
+
+
+def with_short_comments(df, columns):
+    # the shortened comments are only worked out for the courses that are exported
+    df = df.copy()
+    df['best_gem_comment_short'] = df['best_gem_comment'].apply(get_short_gem_comment)
+    if 'best_comment_short' in columns:
+        df['best_comment_short'] = df['best_comment'].apply(get_short_comment)
+        df['best_comment_first'] = df['best_comment'].apply(get_first_sentence)
+    return df[columns]
+
+
+def ranked_mask(df):
+    # courses that can be listed at all: offered on myHarvard this term, with enough
+    # of their students answering the QGuide for the scores to be trusted
+    enough_responses = (df['num_responded'] / df['num_students']
+                        >= 0.8 - 0.1 * numpy.log2(df['num_students'] / 10))
+    return enough_responses & (df['course_id'] != '-1')
+
+
+def build_exports(df, myharvard_year):
+    # map each output file, relative to the release folder, to its DataFrame (or list)
+    # the masks shared by several listings are computed once
+    ranked = ranked_mask(df)
+    has_gem = df['gem_probability_mean'] > 0
+    # as in the notebook, a course without a gem probability is in neither mask
+    no_gem = df['gem_probability_mean'] <= 0
+    top_scores = ((df['course_score_median'] == 5)
+                  & (df['lecturer_score_median'] == 5)
+                  & (df['rec_score_median'] == 5))
+    rated = top_scores & ranked
+
+    # sorted by gem probability first, like the notebook did, so ties in course score keep their order
+    super_gems = df[rated & has_gem].sort_values(by=['gem_probability_mean'], ascending=False)
+    super_gems = super_gems.sort_values(by=['course_score_mean'], ascending=False)
+    great_courses = df[rated & no_gem & (df['workload_score_mean'] > 4)]
+    great_courses = great_courses.sort_values(by=['course_score_mean'], ascending=False)
+    hidden_gems = df[rated & no_gem & (df['workload_score_mean'] <= 4)]
+    hidden_gems = hidden_gems.sort_values(by=['workload_score_mean'], ascending=True)
+
+    gems = gem_columns(myharvard_year)
+    comments = comment_columns(myharvard_year)
+    exports = {
+        'super_gems.json': with_short_comments(super_gems, gems),
+        'great_courses.json': with_short_comments(great_courses, comments),
+        'hidden_gems.json': with_short_comments(hidden_gems, comments),
+    }
+
+    department_list = sorted(df['department'].dropna().unique())
+    exports['department_list.json'] = department_list
+
+    # one pass over the gem candidates; groups keep the row order of df, so each
+    # department sorts exactly as when it was filtered out on its own
+    candidates = df[has_gem & (df['workload_score_mean'] < 7) & ranked]
+    groups = dict(tuple(candidates.groupby('department', sort=False)))
+    for department in department_list:
+        # departments without gems still get a file, with an empty list
+        group = groups.get(department, candidates.iloc[:0])
+        top = group.sort_values(by=['gem_probability_mean'], ascending=False).head(DEPARTMENT_TOP)
+        exports[os.path.join('departments', department + '.json')] = with_short_comments(top, gems)
+    return exports
+
+
+def serialize(data, serializer='pandas'):
+    # "pandas" writes the bytes DataFrame.to_json and json.dump always have, so files
+    # that didn't change stay byte-identical; "orjson" is faster but prints floats at
+    # full precision and unicode unescaped
+    if serializer == 'orjson':
+        try:
+            import orjson
+        except ImportError:
+            raise ImportError('serializer="orjson" needs orjson, install the `json` extra, or use "pandas"')
+        if isinstance(data, pd.DataFrame):
+            data = data.to_dict(orient='records')
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    if serializer != 'pandas':
+        raise ValueError(f'Unknown serializer {serializer!r}, use pandas or orjson')
+    if isinstance(data, pd.DataFrame):
+        return data.to_json(orient='records').encode('utf-8')
+    return json.dumps(data).encode('utf-8')
+
+
+def write_if_changed(path, data):
+    # write data to path unless the file already holds exactly that content
+    # returns whether the file was written
+    digest = hashlib.sha256(data).digest()
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            if hashlib.sha256(f.read()).digest() == digest:
+                return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def load_release(myharvard_year, myharvard_term, qguide_year, qguide_term, repo_root=REPO_ROOT):
+    # the prepared qguide_myharvard.csv of a pairing and the release folder it is in
+    folder_name = f"{myharvard_year}_{myharvard_term}_{qguide_year}_{qguide_term}"
+    output_dir = os.path.join(repo_root, "release", "hugems", folder_name)
+    input_file = os.path.join(output_dir, "qguide_myharvard.csv")
+    # uses the typed qguide_myharvard.parquet instead when combine.py wrote one
+    df = prepare(read_table(input_file, combined_schema(myharvard_year, qguide_year)), myharvard_year)
+    return df, output_dir
+
+
+def export_release(myharvard_year, myharvard_term, qguide_year, qguide_term, repo_root=REPO_ROOT,
+                   workers=8, serializer='pandas'):
+    ensure_nltk_data()
+    df, output_dir = load_release(myharvard_year, myharvard_term, qguide_year, qguide_term, repo_root)
+    folder_name = os.path.basename(output_dir)
+    exports = build_exports(df, myharvard_year)
+
+    def write(item):
+        name, data = item
+        return write_if_changed(os.path.join(output_dir, name), serialize(data, serializer))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        written = sum(executor.map(write, exports.items()))
+
+    print(f"{folder_name}: wrote {written} of {len(exports)} files to {output_dir}, "
+          f"{len(exports) - written} unchanged")
+    return written
+
+
+if __name__ == "__main__":
+    # Specify years and terms
+    myharvard_year = "2026"
+    myharvard_term = "Spring"
+    qguide_year = "2025"
+    qguide_term = "Spring"
+    # "orjson" serializes faster (needs orjson) but changes the formatting of every file
+    serializer = "pandas"
+    workers = 8
+
+    export_release(myharvard_year, myharvard_term, qguide_year, qguide_term,
+                   workers=workers, serializer=serializer)
@@ -0,0 +1,231 @@
+# Precomputed ranking index over the courses of a hugems release, so questions like
+# "top gems in Computer Science with a workload under 8 hours" are answered without
+# loading the JSON files or the CSV and filtering them
+# for each of course_score_mean, workload_score_mean and gem_probability_mean the
+# rows of every department are kept sorted by that score, so a top-k query reads the
+# end of one sorted slice and a range query is two binary searches
+# the index is saved as a single file whose arrays are memory-mapped on load:
+#   8 bytes magic | uint64 header length | JSON header | arrays, 8-byte aligned
+# the header holds the departments, where each array starts and the course records
+
+import json
+import os
+import struct
+import time
+
+import numpy
+
+# export (and combine) import pandas and NLTK, which loading and querying a saved
+# index don't need, so they are only imported to build one
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+MAGIC = b'HUGEMIDX'
+VERSION = 1
+
+# scores the index is sorted on
+KEYS = ('course_score_mean', 'workload_score_mean', 'gem_probability_mean')
+
+
+def record_columns(myharvard_year):
+    # what a query returns for each course, the same fields as the gem listings
+    # without the comments
+    return ['course_code', f'course_title_{myharvard_year}', 'department', 'course_score_mean',
+            'rec_score_mean', 'gem_probability_mean', 'sentiment_score_median',
+            'workload_score_mean', 'course_id', 'link']
+
+
+class GemIndex:
+    # rows are numbered by department, so the rows of department d are
+    # bounds[d] <= row < bounds[d + 1]; courses without a department come last
+    # for each key, order_<key> lists the rows of each department sorted by the key
+    # (missing scores last), followed by all rows sorted the same way, and
+    # sorted_<key> holds the matching scores; <key> holds the scores in row order
+
+    def __init__(self, departments, bounds, arrays, records, meta=None):
+        self.departments = list(departments)
+        self.bounds = list(bounds)
+        self.arrays = arrays
+        self.records = records
+        self.meta = meta or {}
+        self.position = {department: i for i, department in enumerate(self.departments)}
+        self.size = len(records)
+
+    @classmethod
+    def from_frame(cls, df, myharvard_year, ranked_only=True):
+        # build the index from a prepared qguide_myharvard frame (export.prepare),
+        # keeping only the courses the listings may show unless ranked_only is False
+        from export import ranked_mask
+
+        if ranked_only:
+            df = df[ranked_mask(df)]
+        # stable, so each department keeps the row order of the CSV
+        df = df.sort_values(by='department', kind='stable', na_position='last')
+        departments, starts = numpy.unique(df['department'].dropna().to_numpy(), return_index=True)
+        bounds = [int(start) for start in starts] + [int(df['department'].notna().sum())]
+
+        rows = numpy.arange(len(df))
+        # a department's segment of each sorted array, then the whole index as the last segment
+        segments = [(bounds[i], bounds[i + 1]) for i in range(len(departments))] + [(0, len(df))]
+        arrays = {}
+        for key in KEYS:
+            values = df[key].to_numpy(dtype=numpy.float64)
+            order = []
+            for start, end in segments:
+                # ties in reverse row order, so reading a slice backwards lists equal
+                # scores in row order, as the notebook's descending sorts do
+                order.append(start + numpy.lexsort((-rows[start:end], values[start:end])))
+            order = numpy.concatenate(order).astype(numpy.int32)
+            arrays[key] = values
+            arrays['order_' + key] = order
+            arrays['sorted_' + key] = values[order]
+
+        records = json.loads(df[record_columns(myharvard_year)].to_json(orient='records'))
+        return cls(departments.tolist(), bounds, arrays, records,
+                   {'myharvard_year': str(myharvard_year)})
+
+    def _segment(self, department):
+        # (start, end) of a department's slice of the sorted arrays, None is every course
+        if department is None:
+            offset = self.bounds[-1]
+            return offset, offset + self.size
+        try:
+            i = self.position[department]
+        except KeyError:
+            raise KeyError(f'Unknown department {department!r}')
+        # the slices of the departments come first, then the slice of every course
+        return self.bounds[i], self.bounds[i + 1]
+
+    def _check_key(self, key):
+        if key not in KEYS:
+            raise ValueError(f'Unknown key {key!r}, the index is sorted on {", ".join(KEYS)}')
+
+    @staticmethod
+    def _in_row_order(order, values):
+        # the sorted arrays keep equal scores in reverse row order for descending reads;
+        # put them back in row order for an ascending read
+        return order[numpy.lexsort((order, values))]
+
+    def top(self, department=None, by='gem_probability_mean', k=5, ascending=False, ranges=None,
+            gems_only=False):
+        # row numbers of the k best courses of a department (None for all courses) by a key,
+        # highest first unless ascending, equal scores in row order either way; ranges maps
+        # keys to inclusive (low, high) bounds (either can be None) the courses must fall
+        # within, and gems_only keeps only courses with a gem probability above 0; courses
+        # missing the key are left out
+        self._check_key(by)
+        start, end = self._segment(department)
+        values = self.arrays['sorted_' + by][start:end]
+        # missing scores sort after every number
+        end = start + int(numpy.searchsorted(values, numpy.inf, side='right'))
+        order = self.arrays['order_' + by][start:end]
+        if ascending:
+            order = self._in_row_order(order, self.arrays['sorted_' + by][start:end])
+        else:
+            order = order[::-1]
+        if ranges or gems_only:
+            keep = numpy.ones(len(order), dtype=bool)
+            for key, (low, high) in (ranges or {}).items():
+                self._check_key(key)
+                values = self.arrays[key][order]
+                if low is not None:
+                    keep &= values >= low
+                if high is not None:
+                    keep &= values <= high
+            if gems_only:
+                keep &= self.arrays['gem_probability_mean'][order] > 0
+            order = order[keep]
+        return order[:k]
+
+    def between(self, department=None, key='workload_score_mean', low=None, high=None):
+        # row numbers of the courses of a department (None for all courses) whose key is
+        # within the inclusive bounds, either of which can be None, sorted by the key
+        # (equal scores in row order)
+        self._check_key(key)
+        start, end = self._segment(department)
+        values = self.arrays['sorted_' + key][start:end]
+        low_at = 0 if low is None else int(numpy.searchsorted(values, low, side='left'))
+        high_at = (int(numpy.searchsorted(values, numpy.inf, side='right')) if high is None
+                   else int(numpy.searchsorted(values, high, side='right')))
+        return self._in_row_order(self.arrays['order_' + key][start + low_at:start + high_at],
+                                  values[low_at:high_at])
+
+    def rows(self, row_numbers):
+        # course records of the row numbers returned by top() or between()
+        return [self.records[row] for row in row_numbers]
+
+    def save(self, path):
+        # write the index to a single file, through a temporary file so a reader never
+        # maps a half-written index
+        layout = {}
+        offset = 0
+        for name, array in self.arrays.items():
+            layout[name] = [offset, len(array), array.dtype.str]
+            offset += array.nbytes + (-array.nbytes) % 8
+        header = json.dumps({
+            'version': VERSION,
+            'meta': self.meta,
+            'departments': self.departments,
+            'bounds': self.bounds,
+            'arrays': layout,
+            'records': self.records,
+        }).encode('utf-8')
+        header += b' ' * ((-len(header)) % 8)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+            for array in self.arrays.values():
+                f.write(array.tobytes())
+                f.write(b'\0' * ((-array.nbytes) % 8))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        # open a saved index; the arrays are views of a read-only memory map, so loading
+        # costs parsing the header and pages are read as queries touch them
+        with open(path, 'rb') as f:
+            magic, header_size = f.read(len(MAGIC)), struct.unpack('<Q', f.read(8))[0]
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a gem index')
+            header = json.loads(f.read(header_size))
+        if header['version'] != VERSION:
+            raise ValueError(f'{path} is a version {header["version"]} gem index, expected {VERSION}')
+        data_start = len(MAGIC) + 8 + header_size
+        mapped = numpy.memmap(path, dtype=numpy.uint8, mode='r')
+        arrays = {name: numpy.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + offset)
+                  for name, (offset, count, dtype) in header['arrays'].items()}
+        return cls(header['departments'], header['bounds'], arrays, header['records'], header['meta'])
+
+
+def build_index(myharvard_year, myharvard_term, qguide_year, qguide_term, repo_root=REPO_ROOT):
+    # build the index of a pairing and save it as gem_index.bin in its release folder
+    from export import load_release
+
+    df, output_dir = load_release(myharvard_year, myharvard_term, qguide_year, qguide_term, repo_root)
+    index = GemIndex.from_frame(df, myharvard_year)
+    path = os.path.join(output_dir, 'gem_index.bin')
+    index.save(path)
+    print(f"Indexed {index.size} courses in {len(index.departments)} departments to {path}")
+    return path
+
+
+if __name__ == "__main__":
+    # Specify years and terms
+    myharvard_year = "2026"
+    myharvard_term = "Spring"
+    qguide_year = "2025"
+    qguide_term = "Spring"
+
+    path = build_index(myharvard_year, myharvard_term, qguide_year, qguide_term)
+
+    # demo: the top gems of a department with at most 8 hours of work a week
+    index = GemIndex.load(path)
+    department = index.departments[0]
+    start_time = time.perf_counter()
+    found = index.top(department, 'gem_probability_mean', k=5, ranges={'workload_score_mean': (None, 8)},
+                      gems_only=True)
+    elapsed = time.perf_counter() - start_time
+    print(f"Top gems in {department} under 8 hours ({elapsed * 1e6:.0f}us):")
+    for record in index.rows(found):
+        print(f"  {record['course_code']}: gem {record['gem_probability_mean']}, "
+              f"workload {record['workload_score_mean']}")
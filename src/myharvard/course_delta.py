@@ -0,0 +1,182 @@
+"""
+Delta mode for the repeated myHarvard scrapes during registration.
+
+Instead of re-scraping every course and rewriting all_courses.csv, each run
+compares the fresh course_urls.txt with the courses seen by the previous run
+(kept in course_state.json) and:
+
+- scrapes new URLs at full depth
+- refreshes only the volatile fields (enrolled, waitlist) of known courses,
+  parsing nothing but the course-info block of their pages
+- re-scrapes a known course at full depth once its last full scrape is older
+  than full_refresh_hours
+- forgets URLs that are no longer listed
+
+Every difference is appended to course_changes.jsonl as one JSON line:
+
+    {"at": "...", "url": "...", "change": "added", "fields": {<the whole row>}}
+    {"at": "...", "url": "...", "change": "changed", "fields": {"enrolled": ["12", "15"]}}
+    {"at": "...", "url": "...", "change": "removed", "fields": {"course_title": "..."}}
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from get_all_course_data import HEADERS, course_row, read_course_urls
+from get_course_myharvard import CourseScraperPool
+from http_cache import HTTPCache
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.adaptive import AdaptiveLimiter  # noqa: E402
+from common.instrumentation import count, profiled, timer, write_summary  # noqa: E402
+from common.page_store import PageStore  # noqa: E402
+
+
+def load_state(path: str) -> Dict[str, Dict[str, Any]]:
+    """Courses seen by the previous run: url -> {"data": row, "full_at": time of the last full scrape}."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: Dict[str, Dict[str, Any]], path: str):
+    """Write the state atomically, so a crash leaves the previous run's state intact."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def diff_fields(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """Fields of new whose value differs from old, as field -> [old, new]."""
+    return {field: [old.get(field), value] for field, value in new.items() if old.get(field) != value}
+
+
+class ChangeLog:
+    """Appends change records to the JSONL log as they are found."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "a", encoding="utf-8")
+        self.at = datetime.now().isoformat(timespec="seconds")
+        self.counts = {"added": 0, "changed": 0, "removed": 0}
+
+    def write(self, url: str, change: str, fields: Dict[str, Any]):
+        with timer("write"):
+            self.file.write(json.dumps({"at": self.at, "url": url, "change": change, "fields": fields}) + "\n")
+            self.file.flush()
+        self.counts[change] += 1
+        count(change)
+
+    def close(self):
+        self.file.close()
+
+
+def run_delta(
+    course_urls: List[str],
+    state_path: str = "course_state.json",
+    log_path: str = "course_changes.jsonl",
+    full_refresh_hours: Optional[float] = 24,
+    max_workers: int = 32,
+    cache: Optional[HTTPCache] = None,
+    store: Optional[PageStore] = None,
+) -> Dict[str, int]:
+    """Scrape what changed since the previous run and log the differences.
+
+    Set full_refresh_hours to None to never re-scrape known courses at full depth.
+    Returns the number of added, changed and removed courses.
+    """
+    state = load_state(state_path)
+    now = time.time()
+    course_urls = list(dict.fromkeys(course_urls))
+    listed = set(course_urls)
+
+    added = [url for url in course_urls if url not in state]
+    removed = [url for url in state if url not in listed]
+    known = [url for url in course_urls if url in state]
+    if full_refresh_hours is None:
+        stale = []
+    else:
+        stale = [url for url in known if now - state[url]["full_at"] >= full_refresh_hours * 3600]
+    stale_set = set(stale)
+    volatile = [url for url in known if url not in stale_set]
+    print(f"{len(added)} new, {len(removed)} removed, {len(stale)} due for a full refresh, "
+          f"{len(volatile)} refreshing enrollment only")
+
+    log = ChangeLog(log_path)
+    limiter = AdaptiveLimiter(initial=min(4, max_workers), maximum=max_workers)
+    try:
+        with CourseScraperPool(max_workers, cache=cache, limiter=limiter, store=store) as pool:
+            for url, course in pool.scrape_many(added + stale):
+                if not course:
+                    continue
+                row = dict(zip(HEADERS, course_row(course)))
+                if url in state:
+                    changes = diff_fields(state[url]["data"], row)
+                    if changes:
+                        log.write(url, "changed", changes)
+                else:
+                    log.write(url, "added", row)
+                state[url] = {"data": row, "full_at": now}
+
+            for url, fields in pool.scrape_many(volatile, enrollment_only=True):
+                if not fields:
+                    continue
+                changes = diff_fields(state[url]["data"], fields)
+                if changes:
+                    log.write(url, "changed", changes)
+                    state[url]["data"].update(fields)
+
+        for url in removed:
+            log.write(url, "removed", {"course_title": state.pop(url)["data"].get("course_title")})
+    finally:
+        log.close()
+        # Courses that failed to scrape keep their previous state and are retried next run
+        save_state(state, state_path)
+
+    print(f"Logged {log.counts['added']} added, {log.counts['changed']} changed and "
+          f"{log.counts['removed']} removed courses to {log_path}")
+    return log.counts
+
+
+def main(
+    full_refresh_hours: Optional[float] = 24,
+    max_workers: int = 32,
+    use_cache: bool = True,
+    use_store: bool = True,
+):
+    """Run one delta scrape of the URLs in course_urls.txt."""
+    cache = HTTPCache("http_cache.sqlite") if use_cache else None
+    store = PageStore("raw_pages") if use_store else None
+    try:
+        course_urls = read_course_urls("course_urls.txt")
+        run_delta(course_urls, full_refresh_hours=full_refresh_hours, max_workers=max_workers,
+                  cache=cache, store=store)
+        # Time per stage and change counts, saved to run_summary_course_delta.json
+        write_summary("course_delta", courses=len(course_urls))
+    finally:
+        if cache:
+            cache.close()
+
+
+if __name__ == "__main__":
+    # Known courses are scraped at full depth again once their last full scrape is this old
+    full_refresh_hours = 24
+    max_workers = 32
+    # Revalidate cached pages with conditional requests, unchanged pages cost a 304
+    use_cache = True
+    # Save every downloaded page to the compressed page store in raw_pages/
+    use_store = True
+
+    # Set PIPELINE_PROFILE=cprofile to profile the run
+    with profiled("course_delta"):
+        main(full_refresh_hours, max_workers, use_cache, use_store)
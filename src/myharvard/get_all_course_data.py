@@ -1,11 +1,24 @@
 # use get_course_myharvard.py to scrape all the URLs given in course_urls.txt and return all the data as a CSV. Concat the instructors with commas.
 
 import csv
-from typing import List, Dict, Any, Optional
+import hashlib
+import os
+import sys
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from get_course_myharvard import CourseScraper
-import pandas as pd
+from get_course_myharvard import COURSE_FIELDS, Course, CourseScraper, CourseScraperPool
+from http_cache import HTTPCache
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.adaptive import AdaptiveLimiter  # noqa: E402
+from common.columnar import MYHARVARD_SCHEMA, check_formats, csv_to_parquet  # noqa: E402
+from common.instrumentation import count, profiled, timer, write_summary  # noqa: E402
+from common.page_store import PageStore  # noqa: E402
+
+
+# CSV headers, the fields of Course in order
+HEADERS = list(COURSE_FIELDS)
+INSTRUCTORS = HEADERS.index("instructors")
 
 
 def read_course_urls(filename: str) -> List[str]:
@@ -19,100 +32,132 @@ def format_instructors(instructors: List[Dict[str, str]]) -> str:
     return ", ".join(instructor["name"] for instructor in instructors)
 
 
-def scrape_single_course(url: str) -> Optional[Dict[str, Any]]:
-    """Scrape a single course and return its data."""
-    try:
-        scraper = CourseScraper(url)
-        course_data = scraper.scrape()
-        course_data["instructors"] = format_instructors(course_data["instructors"])
-        return course_data
-    except Exception as e:
-        tqdm.write(f"Error scraping {url}: {str(e)}")
-        return None
+def course_row(course: Course) -> Tuple[Any, ...]:
+    """The CSV row of a course, in HEADERS order, with the instructors joined."""
+    row = course.values()
+    return (*row[:INSTRUCTORS], format_instructors(course.instructors), *row[INSTRUCTORS + 1:])
 
 
-def scrape_all_courses(
-    course_urls: List[str], output_file: str = "all_courses.csv", max_workers: int = 10
-):
-    """Scrape all courses and save to CSV using multiple threads."""
-    # Define CSV headers based on the course data structure
-    headers = [
-        "course_title",
-        "subject_catalog",
-        "instructors",
-        "year_term",
-        "term_type",
-        "start_date",
-        "end_date",
-        "start_time",
-        "end_time",
-        "weekdays",
-        "class_number",
-        "course_id",
-        "consent",
-        "enrolled",
-        "waitlist",
-        "lecture_sunday",
-        "lecture_monday",
-        "lecture_tuesday",
-        "lecture_wednesday",
-        "lecture_thursday",
-        "lecture_friday",
-        "lecture_saturday",
-        "description",
-        "notes",
-        "school",
-        "units",
-        "cross_registration",
-        "department",
-        "course_component",
-        "instruction_mode",
-        "grading_basis",
-        "course_requirements",
-        "general_education",
-        "quantitative_reasoning",
-        "divisional_distribution",
-    ]
-
-    # List to store all course data
-    all_course_data = []
-
-    # Use ThreadPoolExecutor for parallel scraping
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all tasks
-        future_to_course = {
-            executor.submit(scrape_single_course, url): url
-            for url in course_urls
-        }
-
-        # Process completed tasks with tqdm progress bar
-        with tqdm(
-            total=len(course_urls), desc="Scraping courses", unit="course"
-        ) as pbar:
-            for future in as_completed(future_to_course):
-                course_data = future.result()
-                if course_data:
-                    all_course_data.append(course_data)
-                pbar.update(1)
+def row_digest(row: Sequence[Any]) -> bytes:
+    """Digest of a course row's values, used to spot duplicate rows."""
+    values = "\x1f".join(f"{type(value).__name__}:{value}" for value in row)
+    return hashlib.blake2b(values.encode("utf-8"), digest_size=16).digest()
+
+
+def write_courses(
+    results: Iterable[Tuple[str, Optional[Course]]], total: int, output_file: str, desc: str
+) -> int:
+    """Write (url, course data) results to the CSV and return the number of unique rows.
 
-    # Convert to DataFrame and drop duplicates
-    df = pd.DataFrame(all_course_data)
-    df = df.drop_duplicates()
-    print(f"Found {len(df)} unique courses after removing duplicates")
-    
-    # Write unique courses to CSV
+    Unique courses are streamed to the CSV as they come, so a crash keeps every row
+    scraped so far and no course is held in memory after it is written.
+    Duplicates are dropped on the fly by a digest of the row's values.
+    """
+    seen_rows = set()
     with open(output_file, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=headers)
-        writer.writeheader()
-        for _, row in df.iterrows():
-            writer.writerow(row.to_dict())
+        writer = csv.writer(csvfile)
+        writer.writerow(HEADERS)
+        with tqdm(total=total, desc=desc, unit="course") as pbar:
+            for _, course in results:
+                if course:
+                    row = course_row(course)
+                    digest = row_digest(row)
+                    if digest not in seen_rows:
+                        seen_rows.add(digest)
+                        with timer("write"):
+                            writer.writerow(row)
+                            csvfile.flush()
+                    else:
+                        count("duplicates")
+                pbar.update(1)
 
+    print(f"Found {len(seen_rows)} unique courses after removing duplicates")
+    return len(seen_rows)
 
-def main():
-    """Main function to run the scraper."""
-    debug = False
 
+def scrape_all_courses(
+    course_urls: List[str],
+    output_file: str = "all_courses.csv",
+    max_workers: int = 32,
+    cache: Optional[HTTPCache] = None,
+    output_formats: Sequence[str] = ("csv",),
+    limiter: Optional[AdaptiveLimiter] = None,
+    store: Optional[PageStore] = None,
+):
+    """Scrape all courses and save to CSV using multiple threads.
+
+    The threads share one keep-alive HTTP session and an AdaptiveLimiter, so the
+    number of requests in flight follows what the server sustains, up to max_workers.
+    With a store, every page is also saved to it for offline re-parsing.
+    With "parquet" in output_formats, a typed Parquet copy is written next to the CSV.
+    """
+    limiter = limiter or AdaptiveLimiter(initial=min(4, max_workers), maximum=max_workers)
+    check_formats(output_formats)
+
+    # Scrape in parallel, handling each course as soon as it is done
+    with CourseScraperPool(max_workers, cache=cache, limiter=limiter, store=store) as pool:
+        write_courses(pool.scrape_many(course_urls), len(course_urls), output_file, "Scraping courses")
+    print(f"Concurrency peaked at {int(limiter.peak_limit)} and ended at {limiter.concurrency}")
+
+    if "parquet" in output_formats:
+        with timer("write"):
+            csv_to_parquet(output_file, MYHARVARD_SCHEMA)
+
+
+def parse_stored_courses(
+    store: PageStore,
+    course_urls: Optional[List[str]] = None,
+    output_file: str = "all_courses.csv",
+    output_formats: Sequence[str] = ("csv",),
+):
+    """Re-parse course pages saved in the page store into the CSV, without any network.
+
+    Parses the given URLs, or every page in the store.
+    """
+    check_formats(output_formats)
+    course_urls = list(store.keys()) if course_urls is None else course_urls
+    scraper = CourseScraper("")
+
+    def parse_all() -> Iterator[Tuple[str, Optional[Course]]]:
+        for url in course_urls:
+            try:
+                with timer("read"):
+                    page = store.get(url)
+                if page is None:
+                    raise KeyError("not in the page store")
+                with timer("parse"):
+                    yield url, scraper.parse(page)
+            except Exception as e:
+                count("failed")
+                tqdm.write(f"Error parsing {url}: {str(e)}")
+                yield url, None
+
+    write_courses(parse_all(), len(course_urls), output_file, "Parsing stored courses")
+
+    if "parquet" in output_formats:
+        with timer("write"):
+            csv_to_parquet(output_file, MYHARVARD_SCHEMA)
+
+
+def main(
+    use_cache: bool = True,
+    output_formats: Sequence[str] = ("csv",),
+    use_store: bool = True,
+    offline: bool = False,
+    debug: bool = False,
+):
+    """Scrape every course in course_urls.txt into all_courses.csv.
+
+    With offline, all_courses.csv is rebuilt from the pages in raw_pages/ instead.
+    """
+    cache = HTTPCache("http_cache.sqlite") if use_cache and not offline else None
+    store = PageStore("raw_pages") if use_store or offline else None
     try:
+        if offline:
+            parse_stored_courses(store, output_formats=output_formats)
+            write_summary("get_all_course_data", courses=len(store), offline=True)
+            return
+
         course_urls = read_course_urls("course_urls.txt")
         print(f"Found {len(course_urls)} courses to scrape")
 
@@ -125,11 +170,29 @@ def main():
                 course_urls = random.sample(course_urls, 100)
                 print("Testing with random 100 courses")
 
-        scrape_all_courses(course_urls)
+        scrape_all_courses(course_urls, cache=cache, output_formats=output_formats, store=store)
         print("Scraping completed successfully!")
+        # Time per stage, bytes and cache hits, saved to run_summary_get_all_course_data.json
+        write_summary("get_all_course_data", courses=len(course_urls), use_cache=use_cache)
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+    finally:
+        if cache:
+            cache.close()
 
 
 if __name__ == "__main__":
-    main()
+    # Revalidate pages cached by earlier runs instead of downloading them again
+    use_cache = True
+    # Add "parquet" to also write a typed all_courses.parquet (needs pyarrow)
+    output_formats = ["csv"]
+    # Save every downloaded page to the compressed page store in raw_pages/
+    use_store = True
+    # Re-parse the pages saved in raw_pages/ instead of downloading them
+    offline = False
+    # Scrape a random sample of 100 courses only
+    debug = False
+
+    # Set PIPELINE_PROFILE=cprofile to profile the run
+    with profiled("get_all_course_data"):
+        main(use_cache, output_formats, use_store, offline, debug)
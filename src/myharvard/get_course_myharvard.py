@@ -1,24 +1,184 @@
+import hashlib
+import os
+import sys
+import time
 import requests
-from bs4 import BeautifulSoup, Tag, NavigableString
+from bs4 import BeautifulSoup, SoupStrainer, Tag, NavigableString
 import json
-from typing import Dict, List, Optional, Union, Any
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, fields
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union, Any
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from http_cache import CachedPage, HTTPCache
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.adaptive import AdaptiveLimiter, is_throttled  # noqa: E402
+from common.instrumentation import count, timer  # noqa: E402
+from common.page_store import PageStore  # noqa: E402
+from common.parsing import make_soup  # noqa: E402
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+def make_session(pool_size: int = 32) -> requests.Session:
+    """Keep-alive session to share between scraper threads.
+
+    Up to pool_size connections per host stay open and are reused by later requests
+    (threads beyond that wait for a free one), and pages are sent compressed.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+    })
+    return session
+
 
 class CourseDataNotFoundError(Exception):
     pass
 
+
+@dataclass(slots=True)
+class Course:
+    """One scraped course page. The fields, in order, are the columns of all_courses.csv.
+
+    Slotted, so a course holds its values without a per-instance dict, and built by
+    keyword in CourseScraper.parse, so a field that is missing or misspelled there
+    raises a TypeError instead of producing a misaligned row.
+    """
+    course_title: str
+    subject_catalog: str
+    # [{"name": ...}, ...] as scraped; get_all_course_data joins the names for the CSV
+    instructors: List[Dict[str, str]]
+    year_term: str
+    term_type: str
+    start_date: str
+    end_date: str
+    start_time: str
+    end_time: str
+    weekdays: str
+    class_number: str
+    course_id: str
+    consent: str
+    enrolled: str
+    waitlist: str
+    lecture_sunday: bool
+    lecture_monday: bool
+    lecture_tuesday: bool
+    lecture_wednesday: bool
+    lecture_thursday: bool
+    lecture_friday: bool
+    lecture_saturday: bool
+    description: str
+    notes: str
+    school: str
+    units: str
+    cross_registration: str
+    department: str
+    course_component: str
+    instruction_mode: str
+    grading_basis: str
+    course_requirements: str
+    general_education: str
+    quantitative_reasoning: str
+    divisional_distribution: str
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Course":
+        """Rebuild a course from to_dict() output, e.g. the parsed data kept in the HTTP cache."""
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in COURSE_FIELDS}
+
+    def values(self) -> Tuple[Any, ...]:
+        """The field values in column order."""
+        return tuple(getattr(self, name) for name in COURSE_FIELDS)
+
+
+COURSE_FIELDS: Tuple[str, ...] = tuple(field.name for field in fields(Course))
+
+
 class CourseScraper:
-    def __init__(self, url: str, debug: bool = False):
+    # Bump this whenever a change to the extraction alters the scraped data,
+    # so parsed results cached by an older version are re-parsed
+    PARSE_VERSION = 1
+    # Attempts per page when the server throttles (429/5xx) a request made through a limiter
+    MAX_ATTEMPTS = 4
+    # Fields that change during registration, refreshed by scrape_enrollment()
+    VOLATILE_FIELDS = ('enrolled', 'waitlist')
+
+    def __init__(self, url: str, debug: bool = False, cache: Optional[HTTPCache] = None,
+                 limiter: Optional[AdaptiveLimiter] = None, session: Optional[requests.Session] = None,
+                 store: Optional[PageStore] = None):
         self.url = url
         self.debug = debug
+        self.cache = cache
+        self.limiter = limiter
+        # Raw page store every fetched page is saved to, keyed by URL, for offline re-parsing
+        self.store = store
+        # Shared pooled session (see make_session); without one every request opens a new connection
+        self.session = session
         self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': USER_AGENT
         }
         self.soup: Optional[BeautifulSoup] = None
+        # Label text -> value text for every <strong> label, collected in one pass
+        self.labels: Optional[Dict[str, str]] = None
+        # Set when the server answered 304 and the cached page was reused
+        self.cached_page: Optional[CachedPage] = None
+
+    def _get(self, headers: Dict[str, str]) -> requests.Response:
+        """GET the page, through the shared limiter (retrying throttled requests) if there is one."""
+        http = self.session or requests
+        if not self.limiter:
+            with timer("network"):
+                response = http.get(self.url, headers=headers)
+            count("bytes_downloaded", len(response.content))
+            return response
+
+        for attempt in range(self.MAX_ATTEMPTS):
+            with self.limiter.slot() as slot:
+                with timer("network"):
+                    response = http.get(self.url, headers=headers)
+                slot.record(response.status_code, response.headers.get("Retry-After"))
+            count("bytes_downloaded", len(response.content))
+            if not is_throttled(response.status_code) or attempt == self.MAX_ATTEMPTS - 1:
+                break
+            count("retries")
+            # With a Retry-After the limiter holds every thread back; otherwise back off a little
+            if slot.retry_after is None:
+                time.sleep(2 ** attempt)
+        return response
 
     def _make_request(self) -> str:
         """Make HTTP request and return response text."""
-        response = requests.get(self.url, headers=self.headers)
+        if not self.cache:
+            response = self._get(self.headers)
+            response.raise_for_status()
+            return response.text
+
+        # Revalidate the cached copy, if any, instead of downloading it again
+        cached = self.cache.get(self.url, self.PARSE_VERSION)
+        headers = {**self.headers, **self.cache.conditional_headers(cached)}
+        response = self._get(headers)
+        if cached and response.status_code == 304:
+            count("not_modified")
+            self.cached_page = cached
+            return cached.body
         response.raise_for_status()
+        self.cache.store(
+            self.url,
+            response.text,
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+        )
         return response.text
 
     def _safe_text(self, element: Optional[Union[Tag, NavigableString]]) -> str:
@@ -27,20 +187,26 @@ class CourseScraper:
             return ""
         return element.text.strip()
 
+    def _collect_labels(self) -> Dict[str, str]:
+        """Walk the <strong> labels once and map each label text to its value text."""
+        labels: Dict[str, str] = {}
+        if not self.soup:
+            return labels
+
+        for label in self.soup.find_all('strong'):
+            label_text = label.string
+            # The first label with a given text wins, like soup.find would
+            if label_text is None or label_text in labels:
+                continue
+            value = label.find_next_sibling('span') or label.find_next_sibling('a')
+            labels[str(label_text)] = value.text.strip() if isinstance(value, Tag) else ""
+        return labels
+
     def _safe_label_text(self, label_text: str) -> str:
         """Safely extract text from a div with label."""
-        if not self.soup:
-            return ""
-            
-        label = self.soup.find('strong', string=label_text)
-        if not label or not isinstance(label, Tag):
-            return ""
-        
-        value = label.find_next_sibling('span') or label.find_next_sibling('a')
-        if not value or not isinstance(value, Tag):
-            return ""
-        
-        return value.text.strip()
+        if self.labels is None:
+            self.labels = self._collect_labels()
+        return self.labels.get(label_text, "")
 
     def _safe_div_text(self, div_id: str, field_name: str) -> str:
         """Safely extract text from a div with ID."""
@@ -213,67 +379,104 @@ class CourseScraper:
             'subject_catalog': subject_catalog
         }
 
-    def scrape(self) -> Dict[str, Any]:
+    def parse(self, html_content: str) -> Course:
+        """Extract the course data from a course page, without any network access."""
+        self.soup = make_soup(html_content)
+        self.labels = None
+        
+        # Extract course title information
+        title_info = self._extract_course_title()
+        
+        if not title_info['course_title']:
+            raise CourseDataNotFoundError("Critical course information (course title) is missing")
+        
+        # Extract course time information
+        course_time_div = self.soup.find('div', id='course-time')
+        if not course_time_div or not isinstance(course_time_div, Tag):
+            year_term = ""
+            term_type = ""
+        else:
+            spans = course_time_div.find_all('span')
+            year_term = self._safe_text(spans[0] if len(spans) > 0 else None)
+            term_type = self._safe_text(spans[1] if len(spans) > 1 else None)
+        
+        # Combine all data
+        return Course(
+            **title_info,  # This includes course_title and subject_catalog
+            instructors=self._extract_instructors(),
+            year_term=year_term,
+            term_type=term_type,
+            **self._extract_event_data(),
+            **self._extract_course_info(),
+            **{f'lecture_{day}': value for day, value in self._extract_days().items()},
+            
+            # Additional course information
+            description=self._safe_div_text('course-desc', 'description'),
+            notes=self._safe_div_text('course-notes', 'notes'),
+            school=self._safe_label_text('School'),
+            units=self._safe_label_text('Units'),
+            cross_registration=self._safe_label_text('Cross Reg'),
+            department=self._safe_label_text('Department'),
+            course_component=self._safe_label_text('Course Component'),
+            instruction_mode=self._safe_label_text('Instruction Mode'),
+            grading_basis=self._safe_label_text('Grading Basis'),
+            course_requirements=self._safe_label_text('Course Requirements'),
+            general_education=self._safe_label_text('General Education'),
+            quantitative_reasoning=self._safe_label_text('Quantitative Reasoning with Data'),
+            divisional_distribution=self._safe_label_text('Divisional Distribution'),
+        )
+
+    def parse_enrollment(self, html_content: str) -> Dict[str, str]:
+        """Extract only the volatile fields, building nothing but the course-info block."""
+        self.soup = make_soup(html_content, parse_only=SoupStrainer('div', id='course-info'))
+        self.labels = None
+        course_info = self._extract_course_info()
+        return {field: course_info[field] for field in self.VOLATILE_FIELDS}
+
+    def _fetch(self) -> str:
+        """Download (or revalidate) the page and save it to the page store."""
+        html_content = self._make_request()
+        if self.store is not None:
+            with timer("store"):
+                self.store.put(self.url, html_content)
+        return html_content
+
+    def scrape_enrollment(self) -> Dict[str, str]:
+        """Fetch the page and return just its VOLATILE_FIELDS."""
+        html_content = self._fetch()
+        if self.cached_page and self.cached_page.parsed is not None:
+            count("parse_cache_hits")
+            return {field: self.cached_page.parsed[field] for field in self.VOLATILE_FIELDS}
+        with timer("parse"):
+            return self.parse_enrollment(html_content)
+
+    def scrape(self) -> Course:
         """Main method to scrape course data."""
         try:
             # Get and parse HTML
-            html_content = self._make_request()
+            html_content = self._fetch()
+
+            # Unchanged page that was already parsed by this version
+            if self.cached_page and self.cached_page.parsed is not None:
+                count("parse_cache_hits")
+                return Course.from_dict(self.cached_page.parsed)
             
             # Save HTML content if debug mode is enabled
             if self.debug:
-                import os
-                from datetime import datetime
                 debug_dir = "debug_html"
                 os.makedirs(debug_dir, exist_ok=True)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{debug_dir}/course_{timestamp}.html"
+                # Named after the content, so pages saved within the same second don't overwrite each other
+                digest = hashlib.sha256(html_content.encode('utf-8')).hexdigest()[:16]
+                filename = f"{debug_dir}/course_{digest}.html"
                 with open(filename, 'w', encoding='utf-8') as f:
                     f.write(html_content)
                 print(f"Saved HTML content to {filename}")
             
-            self.soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Extract course title information
-            title_info = self._extract_course_title()
-            
-            if not title_info['course_title']:
-                raise CourseDataNotFoundError("Critical course information (course title) is missing")
-            
-            # Extract course time information
-            course_time_div = self.soup.find('div', id='course-time')
-            if not course_time_div or not isinstance(course_time_div, Tag):
-                year_term = ""
-                term_type = ""
-            else:
-                spans = course_time_div.find_all('span')
-                year_term = self._safe_text(spans[0] if len(spans) > 0 else None)
-                term_type = self._safe_text(spans[1] if len(spans) > 1 else None)
-            
-            # Combine all data
-            course_data = {
-                **title_info,  # This includes course_title and subject_catalog
-                'instructors': self._extract_instructors(),
-                'year_term': year_term,
-                'term_type': term_type,
-                **self._extract_event_data(),
-                **self._extract_course_info(),
-                **{f'lecture_{day}': value for day, value in self._extract_days().items()},
-                
-                # Additional course information
-                'description': self._safe_div_text('course-desc', 'description'),
-                'notes': self._safe_div_text('course-notes', 'notes'),
-                'school': self._safe_label_text('School'),
-                'units': self._safe_label_text('Units'),
-                'cross_registration': self._safe_label_text('Cross Reg'),
-                'department': self._safe_label_text('Department'),
-                'course_component': self._safe_label_text('Course Component'),
-                'instruction_mode': self._safe_label_text('Instruction Mode'),
-                'grading_basis': self._safe_label_text('Grading Basis'),
-                'course_requirements': self._safe_label_text('Course Requirements'),
-                'general_education': self._safe_label_text('General Education'),
-                'quantitative_reasoning': self._safe_label_text('Quantitative Reasoning with Data'),
-                'divisional_distribution': self._safe_label_text('Divisional Distribution')
-            }
+            with timer("parse"):
+                course_data = self.parse(html_content)
+
+            if self.cache:
+                self.cache.store_parsed(self.url, course_data.to_dict(), self.PARSE_VERSION)
             
             return course_data
             
@@ -288,6 +491,65 @@ class CourseScraper:
             raise
 
 
+class CourseScraperPool:
+    """Scrape many course pages from a thread pool sharing one pooled session."""
+
+    def __init__(self, max_workers: int = 32, cache: Optional[HTTPCache] = None,
+                 limiter: Optional[AdaptiveLimiter] = None, session: Optional[requests.Session] = None,
+                 pool_size: Optional[int] = None, store: Optional[PageStore] = None):
+        self.max_workers = max_workers
+        self.cache = cache
+        self.limiter = limiter
+        self.store = store
+        # Without a session, open one with a connection per worker (or pool_size connections)
+        self.owns_session = session is None
+        self.session = session or make_session(pool_size=pool_size or max_workers)
+
+    def scrape_one(self, url: str, enrollment_only: bool = False) -> Optional[Union[Course, Dict[str, str]]]:
+        """Scrape one course, returning None (after logging the error) if it fails.
+
+        With enrollment_only, returns just the VOLATILE_FIELDS as a dict.
+        """
+        try:
+            scraper = CourseScraper(url, cache=self.cache, limiter=self.limiter, session=self.session,
+                                    store=self.store)
+            return scraper.scrape_enrollment() if enrollment_only else scraper.scrape()
+        except Exception as e:
+            count("failed")
+            tqdm.write(f"Error scraping {url}: {str(e)}")
+            return None
+
+    def scrape_many(self, urls: Iterable[str],
+                    enrollment_only: bool = False) -> Iterator[Tuple[str, Optional[Union[Course, Dict[str, str]]]]]:
+        """Yield (url, course data or None) for every URL as soon as it is scraped.
+
+        Results come in completion order. Only a couple of pages per worker are queued
+        at a time, so urls can be a lazy iterable and nothing piles up in memory.
+        With enrollment_only, only the VOLATILE_FIELDS of each course are extracted.
+        """
+        urls = iter(urls)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(self.scrape_one, url, enrollment_only): url
+                       for url in islice(urls, 2 * self.max_workers)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = pending.pop(future)
+                    for next_url in islice(urls, 1):
+                        pending[executor.submit(self.scrape_one, next_url, enrollment_only)] = next_url
+                    yield url, future.result()
+
+    def close(self):
+        if self.owns_session:
+            self.session.close()
+
+    def __enter__(self) -> "CourseScraperPool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 if __name__ == "__main__":
     url = "https://beta.my.harvard.edu/course/STAT109A/2025-Fall/001"
     # Example with debug mode enabled
@@ -296,4 +558,4 @@ if __name__ == "__main__":
     
     # Save the course data to a JSON file
     with open('course_data.json', 'w') as f:
-        json.dump(course_data, f, indent=4)
\ No newline at end of file
+        json.dump(course_data.to_dict(), f, indent=4)
\ No newline at end of file
@@ -10,10 +10,37 @@ Example URL: 'https://beta.my.harvard.edu/course/SYSBIO350/2025-Spring/001'
 import requests
 import json
 import time
-from bs4 import BeautifulSoup
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import re
 from tqdm import tqdm
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.instrumentation import count, profiled, timer, write_summary  # noqa: E402
+from common.parsing import make_soup  # noqa: E402
+
+SEARCH_URL = "https://beta.my.harvard.edu/search/?q=&sort=relevance&school=All"
+
+
+class RateLimiter:
+    """Space out requests shared by several threads to at most `rate` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            with timer("rate_limit_wait"):
+                time.sleep(wait_time)
 
 def get_initial_data(base_url, headers):
     """Get initial data to determine total number of courses."""
@@ -28,7 +55,8 @@ def get_initial_data(base_url, headers):
 
 def extract_course_info(html_content):
     """Extract course URLs from HTML content."""
-    soup = BeautifulSoup(html_content, 'html.parser')
+    with timer("parse"):
+        soup = make_soup(html_content)
     course_cards = soup.find_all('div', class_='bg-white')
     
     course_urls = []
@@ -62,24 +90,33 @@ def save_urls(urls, filename, append=False):
 def fetch_page_data(url, headers):
     """Fetch and parse data from a single page."""
     try:
-        response = requests.get(url, headers=headers)
+        with timer("network"):
+            response = requests.get(url, headers=headers)
+        count("bytes_downloaded", len(response.content))
         response.raise_for_status()
         return response.json()
     except requests.RequestException as e:
+        count("failed")
         print(f"\nError fetching the data: {e}")
         return None
     except json.JSONDecodeError as e:
         print(f"\nError parsing JSON: {e}")
         return None
 
-def scrape_harvard_courses(start_page=1, year=None, term=None):
+def scrape_harvard_courses(start_page=1, year=None, term=None, max_workers=8, requests_per_second=10):
     """
     Scrape Harvard courses for a specific academic term.
+
+    Pages are fetched concurrently by `max_workers` threads under a shared rate limit,
+    but processed strictly in page order, so course_urls.txt comes out in the same
+    order and the empty-page stopping rule behaves as if the pages were read one by one.
     
     Args:
         start_page (int): Starting page number for scraping
         year (str): Academic year (e.g., '2024')
         term (str): Term (e.g., 'Fall', 'Spring')
+        max_workers (int): Number of pages fetched at once (1 fetches them one at a time)
+        requests_per_second (float): Upper bound on the request rate to the server
     """
     if not year or not term:
         raise ValueError("Both year and term must be specified")
@@ -89,7 +126,7 @@ def scrape_harvard_courses(start_page=1, year=None, term=None):
         os.remove('course_urls.txt')
         print("Removed existing course_urls.txt to start afresh")
         
-    base_url = "https://beta.my.harvard.edu/search/?q=&sort=relevance&school=All"
+    base_url = SEARCH_URL
     
     # Add term filter
     term_filter = f"&term={year}+{term}"
@@ -117,54 +154,71 @@ def scrape_harvard_courses(start_page=1, year=None, term=None):
         print(f"Resuming with {len(existing_urls)} existing courses")
     print(f"Filtering for {year}-{term}")
     
-    page = start_page
+    # Be respectful to the server: all threads share one request budget
+    rate_limiter = RateLimiter(requests_per_second)
+
+    def fetch_page(page):
+        rate_limiter.wait()
+        return fetch_page_data(f"{base_url}&page={page}", headers)
+
+    # Only stop if we're way past expected pages or many consecutive empty pages
+    expected_max_pages = (total_hits // 10) + 10  # Rough estimate with buffer
     consecutive_empty_pages = 0
-    
-    while True:
-        url = f"{base_url}&page={page}"
-        
-        # Fetch page data
-        data = fetch_page_data(url, headers)
-
-        # Process page data
-        if data and 'hits' in data:
-            course_urls = extract_course_info(data['hits'])
-            
-            if not course_urls:
-                consecutive_empty_pages += 1
-                print(f"\nWarning: Page {page} returned no URLs (likely courses without detail pages)")
+    next_page = start_page
+    in_flight = deque()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Keep a window of max_workers pages in flight, consuming them in page order
+        while True:
+            while len(in_flight) < max_workers:
+                in_flight.append((next_page, executor.submit(fetch_page, next_page)))
+                next_page += 1
+
+            page, future = in_flight.popleft()
+            data = future.result()
+
+            # Process page data
+            if data and 'hits' in data:
+                course_urls = extract_course_info(data['hits'])
+                
+                if not course_urls:
+                    consecutive_empty_pages += 1
+                    print(f"\nWarning: Page {page} returned no URLs (likely courses without detail pages)")
+                    
+                    if consecutive_empty_pages >= 10 or page > expected_max_pages:
+                        pbar.close()
+                        print(f"Reached stopping criteria at page {page}.")
+                        break
+                    continue
                 
-                # Only stop if we're way past expected pages or many consecutive empty pages
-                expected_max_pages = (total_hits // 10) + 10  # Rough estimate with buffer
-                if consecutive_empty_pages >= 10 or page > expected_max_pages:
-                    pbar.close()
-                    print(f"Reached stopping criteria at page {page}.")
-                    break
+                # Reset empty page counter on successful extraction
+                consecutive_empty_pages = 0
                 
-                page += 1
-                time.sleep(0.1)
-                continue
-            
-            # Reset empty page counter on successful extraction
-            consecutive_empty_pages = 0
-            
-            # Update progress and save incrementally
-            pbar.update(len(course_urls))
-            all_course_urls.extend(course_urls)
-            save_urls(course_urls, 'course_urls.txt', append=True)
-            
-            # Add a small delay to be respectful to the server
-            time.sleep(0.1)
-            page += 1
-        else:
-            pbar.close()
-            print(f"\nNo 'hits' found in response for page {page}. Stopping.")
-            break
+                # Update progress and save incrementally
+                pbar.update(len(course_urls))
+                all_course_urls.extend(course_urls)
+                save_urls(course_urls, 'course_urls.txt', append=True)
+            else:
+                pbar.close()
+                print(f"\nNo 'hits' found in response for page {page}. Stopping.")
+                break
+
+        # Pages fetched past the stopping point are not needed
+        for _, future in in_flight:
+            future.cancel()
     
     print(f"\nTotal courses found: {len(all_course_urls)}")
     print("All course URLs saved to course_urls.txt")
     return all_course_urls
 
+def main(year, term, start_page=1, max_workers=8):
+    """Write the course URLs of a term to course_urls.txt, with a run summary."""
+    course_urls = scrape_harvard_courses(start_page=start_page, year=year, term=term, max_workers=max_workers)
+    # Time per stage and bytes, saved to run_summary_get_myharvard_url_chunks.json
+    write_summary("get_myharvard_url_chunks", max_workers=max_workers, courses=len(course_urls))
+    return course_urls
+
+
 if __name__ == "__main__":
     # Edit this if it stopped prematurely
     # Set start_page > 1 to resume from a specific page
@@ -172,5 +226,8 @@ if __name__ == "__main__":
     start_page = 1  # Start from beginning
     year = "2026"  # Required: specify year
     term = "Spring"  # Required: specify term Fall or Spring
+    max_workers = 8  # Pages fetched at once, set to 1 to fetch one page at a time
     
-    course_urls = scrape_harvard_courses(start_page=start_page, year=year, term=term)
\ No newline at end of file
+    # Set PIPELINE_PROFILE=cprofile to profile the run
+    with profiled("get_myharvard_url_chunks"):
+        main(year, term, start_page, max_workers)
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+HTTP cache for myHarvard course pages.
+
+Stores each page body with its ETag/Last-Modified validators so the next scrape can
+send a conditional request and reuse the cached body (and the parsed course data)
+when the server answers 304 Not Modified.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class CachedPage:
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    parsed: Optional[Dict[str, Any]]
+
+
+class HTTPCache:
+    def __init__(self, path: str = "http_cache.sqlite"):
+        # Shared by the scraper threads, so guard the one connection with a lock
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                parsed TEXT,
+                parse_version INTEGER,
+                fetched_at REAL NOT NULL
+            )"""
+        )
+        self.conn.commit()
+
+    def get(self, url: str, parse_version: Optional[int] = None) -> Optional[CachedPage]:
+        """Return the cached page, with its parsed data if it was parsed by parse_version."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, parsed, parse_version FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if not row:
+            return None
+        body, etag, last_modified, parsed, cached_parse_version = row
+        if parsed is not None and cached_parse_version == parse_version:
+            parsed = json.loads(parsed)
+        else:
+            parsed = None
+        return CachedPage(body, etag, last_modified, parsed)
+
+    def conditional_headers(self, cached: Optional[CachedPage]) -> Dict[str, str]:
+        """Validators to send so the server can answer 304 Not Modified."""
+        headers = {}
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        return headers
+
+    def store(self, url: str, body: str, etag: Optional[str], last_modified: Optional[str]):
+        """Store a freshly downloaded body, dropping any parsed data of the old one."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, NULL, NULL, ?)",
+                (url, body, etag, last_modified, time.time()),
+            )
+            self.conn.commit()
+
+    def store_parsed(self, url: str, parsed: Dict[str, Any], parse_version: int):
+        """Attach the parsed course data to the cached body."""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE pages SET parsed = ?, parse_version = ? WHERE url = ?",
+                (json.dumps(parsed), parse_version, url),
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
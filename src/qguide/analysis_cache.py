@@ -0,0 +1,58 @@
+# on-disk cache of finished analyze() results, keyed by unique_code and the
+# sha256 of the QGuide page, so a re-run only re-analyzes new or changed pages
+
+import hashlib
+import json
+import sqlite3
+
+
+def page_digest(unique_code, folder='QGuides', store=None):
+    # sha256 of the raw bytes of QGuides/<unique_code>.html
+    # pages in the raw page store already have it in the store's index
+    if store is not None and unique_code in store:
+        return store.digest(unique_code)
+    with open(folder + '/' + unique_code + '.html', 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class AnalysisCache:
+    # one row per unique_code holding the analyze() row, whether the course
+    # errored, and the gem sentences found while scoring its comments
+    # entries written by a different analysis version count as misses
+
+    def __init__(self, path='analysis_cache.sqlite', version=1):
+        self.version = version
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS analysis ('
+            ' unique_code TEXT PRIMARY KEY,'
+            ' digest TEXT NOT NULL,'
+            ' version INTEGER NOT NULL,'
+            ' row TEXT NOT NULL,'
+            ' error INTEGER NOT NULL,'
+            ' gem_sentences TEXT NOT NULL)'
+        )
+        self.conn.commit()
+
+    def get_many(self, digests):
+        # digests maps unique_code -> page digest
+        # returns unique_code -> (row, error, gem_sentences) for every fresh entry
+        hits = {}
+        cursor = self.conn.execute(
+            'SELECT unique_code, digest, version, row, error, gem_sentences FROM analysis')
+        for unique_code, digest, version, row, error, gem_sentences in cursor:
+            if digests.get(unique_code) == digest and version == self.version:
+                hits[unique_code] = (json.loads(row), bool(error), json.loads(gem_sentences))
+        return hits
+
+    def put_many(self, entries):
+        # entries is an iterable of (unique_code, digest, row, error, gem_sentences)
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO analysis VALUES (?, ?, ?, ?, ?, ?)',
+            [(unique_code, digest, self.version, json.dumps(row), int(error), json.dumps(gem_sentences))
+             for unique_code, digest, row, error, gem_sentences in entries]
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
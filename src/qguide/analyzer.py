@@ -1,24 +1,110 @@
 # analyze the courses
+# pages are read from the page store raw_pages/ the downloaders save to, and any
+# page missing from it from the folder QGuides (raw_store = None reads QGuides only)
 
 # from scipy import stats
+import math
+import mmap
+import os
 import re
 import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
 
 import pandas as pd
-from bs4 import BeautifulSoup
-from nltk.sentiment import SentimentIntensityAnalyzer
 from tqdm import tqdm
 
-# you might need to uncomment the below
-import nltk
-# nltk.download('vader_lexicon')
-sia = SentimentIntensityAnalyzer()
+import sentiment
+from histogram_stats import histogram_mode, histogram_stats
+from analysis_cache import AnalysisCache, page_digest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.columnar import QGUIDE_SCHEMA, check_formats, records_frame, write_table  # noqa: E402
+from common.instrumentation import collect, count, get_metrics, profiled, timer, write_summary  # noqa: E402
+from common.page_store import PageStore  # noqa: E402
+from common.parsing import make_soup  # noqa: E402
+
+# bump this whenever a change to the analysis alters its output,
+# so cached results from older versions are recomputed
+ANALYSIS_VERSION = 1
+
+# the four statistics kept for every score
+STATS = ('mean', 'median', 'mode', 'stdev')
+
+
+class Rating(NamedTuple):
+    # one analyzed QGuide, in the column order of the analysis part of course_ratings.csv
+    # finish_ratings() fills it in by name, so a field added, dropped or misspelled there
+    # raises a TypeError instead of shifting the columns
+    unique_code: str
+    course_id: str
+    num_responded: str
+    num_students: str
+    course_score_mean: float
+    course_score_median: float
+    course_score_mode: float
+    course_score_stdev: float
+    lecturer_score_mean: float
+    lecturer_score_median: float
+    lecturer_score_mode: float
+    lecturer_score_stdev: float
+    workload_score_mean: float
+    workload_score_median: float
+    workload_score_mode: float
+    workload_score_stdev: float
+    rec_score_mean: float
+    rec_score_median: float
+    rec_score_mode: float
+    rec_score_stdev: float
+    sentiment_score_mean: float
+    sentiment_score_median: float
+    sentiment_score_mode: float
+    sentiment_score_stdev: float
+    gem_probability_mean: float
+    gem_probability_median: float
+    gem_probability_mode: float
+    gem_probability_stdev: float
+    best_comment: str
+    max_sent_score: float
+    worse_comment: str
+    min_sent_score: float
+    best_gem_comment: str
+    max_gem_probability: float
+
+
+COLUMNS = list(Rating._fields)
+
+
+def stat_fields(prefix, stats):
+    # {prefix_mean: ..., prefix_median: ..., prefix_mode: ..., prefix_stdev: ...}
+    if len(stats) != len(STATS):
+        raise ValueError(f'{prefix} has {len(stats)} statistics, expected {len(STATS)}')
+    return {f'{prefix}_{stat}': value for stat, value in zip(STATS, stats)}
 
 
 def process_rows(raw_rows):
     return [x.text for x in raw_rows]
 
 
+class Histogram(NamedTuple):
+    # a score whose median, mode and stdev are still to be computed from its histogram
+    # freqs[i] is the percentage of responses that gave score i + 1
+    mean: float
+    freqs: list
+
+
+class PendingRating(NamedTuple):
+    # what read_rating() got out of a QGuide, before the histogram statistics
+    # fields: the Rating fields other than the score statistics
+    # scores: prefix -> [mean, median, mode, stdev], or a Histogram
+    # rec_stats: [mean, median, stdev] of the recommendation score, whose mode comes from rec_freqs
+    fields: dict
+    scores: dict
+    rec_stats: list
+    rec_freqs: list
+
+
 def get_stats(raw_rows):
     rows = process_rows(raw_rows)
     if int(rows[0]) == 0:
@@ -26,16 +112,9 @@ def get_stats(raw_rows):
         return [0, 0, 0, -1]
     freqs = rows[1:-2]
     freqs = [int(x[:-1]) for x in freqs]
-    scores = []
     freqs.reverse()
-    for i in range(5):
-        scores += [i + 1] * freqs[i]
-
-    mean = float(rows[-2])
-    median = statistics.median(scores)
-    mode = statistics.mode(scores)
-    stdev = statistics.stdev(scores)
-    return [mean, median, mode, stdev]
+    # the median, mode and stdev are computed with every other course of the shard
+    return Histogram(float(rows[-2]), freqs[:5])
 
 
 possible_gem_sentences = []
@@ -46,9 +125,9 @@ def get_gem_probability(comment):
     sentences = comment.split('.')
     for sentence in sentences:
         if re.search(r'\bgem\b', sentence.lower()):
-            sentiment = sia.polarity_scores(sentence)['compound']
-            possible_gem_sentences.append((sentence, str(sentiment)))
-            if sentiment <= 0:
+            sentence_score = sentiment.compound(sentence)
+            possible_gem_sentences.append((sentence, str(sentence_score)))
+            if sentence_score <= 0:
                 # negative sentiment, most likely not a gem
                 continue
             else:
@@ -64,20 +143,100 @@ num_errors = 0
 error_codes = []
 
 
-def get_table_with(tables, th_text):
-    # returns None or the table with the first th equals th_text
+def index_tables(tables):
+    # maps the text of each table's first th to the table, in one pass,
+    # so every question is a dict lookup instead of a scan over the tables
+    # the first table with a given header wins
+    by_header = {}
     for table in tables:
-        if table.tr.th and table.tr.th.text.strip() == th_text:
-            return table
-    return None
+        if table.tr and table.tr.th:
+            by_header.setdefault(table.tr.th.text.strip(), table)
+    return by_header
+
+
+# compressed page store the downloaders save to, read before the QGuides folder
+# set by main(); every process opens its own PageStore from it
+store_path = None
+_store = None
+
+
+def init_worker(path):
+    # run in every worker process, which may not inherit the parent's globals
+    global store_path
+    store_path = path
+    sentiment.get_analyzer()
+
+
+def get_store():
+    global _store
+    if not store_path or not os.path.isdir(store_path):
+        return None
+    if _store is None or _store.root != store_path:
+        _store = PageStore(store_path)
+    return _store
+
+
+# tags are case-insensitive in HTML, as they are to the parser
+TBODY_START = re.compile(rb'<tbody', re.IGNORECASE)
+TBODY_END = re.compile(rb'</tbody\s*>', re.IGNORECASE)
 
 
-def analyze(unique_code):
+def tbody_fragments(page):
+    # cut the <tbody> regions out of a page (bytes or an mmap) without decoding the rest,
+    # each wrapped in <table> so the fragments parse the same as inside the full page
+    fragments = []
+    start = TBODY_START.search(page)
+    while start:
+        end = TBODY_END.search(page, start.start())
+        end = len(page) if end is None else end.end()
+        fragments.append(b'<table>' + page[start.start():end] + b'</table>')
+        start = TBODY_START.search(page, end)
+    return b''.join(fragments)
+
+
+def decode_fragments(fragments):
+    # same newlines as reading the page in text mode
+    return fragments.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def read_qguide_tables(unique_code, folder='QGuides'):
+    # the <tbody> fragments of a QGuide as text, and the size of the whole page
+    # files are memory-mapped, so only the table regions are ever copied into Python
+    store = get_store()
+    if store is not None and unique_code in store:
+        page = store.get_bytes(unique_code)
+        size = len(page)
+        fragments = tbody_fragments(page)
+    else:
+        with open(folder + '/' + unique_code + '.html', 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                fragments = b''
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as page:
+                    fragments = tbody_fragments(page)
+    return decode_fragments(fragments), size
+
+
+def analyze(unique_code, page=None):
+    # page, if given, is the raw bytes of the QGuide, which is then not read from disk
+    return finish_ratings([read_rating(unique_code, page)])[0]
+
+
+def read_rating(unique_code, page=None):
+    # everything analyze() needs from a QGuide, or None if it can't be analyzed
     global num_errors, error_codes
-    with open('QGuides/' + unique_code + '.html', 'r') as f:
-        page_text = f.read()
-    soup = BeautifulSoup(page_text, 'html.parser')
-    tables = soup.find_all('tbody')
+    with timer('read'):
+        if page is None:
+            fragments, size = read_qguide_tables(unique_code)
+        else:
+            fragments, size = decode_fragments(tbody_fragments(page)), len(page)
+    count('bytes_read', size)
+    with timer('parse'):
+        # only the tables are parsed, not the rest of the page
+        soup = make_soup(fragments)
+        tables = soup.find_all('tbody')
+        by_header = index_tables(tables)
     print(unique_code)
     no_comment_flag = False
     if len(tables) != 8:
@@ -85,25 +244,25 @@ def analyze(unique_code):
             print('ERROR: Course missing most tables')
             num_errors += 1
             error_codes.append(unique_code)
-            return []
+            return None
         # check if no comments
         if tables[-1].th and tables[-1].th.text.strip() == 'Elective':
             print('Course missing comments table')
             no_comment_flag = True
     # number of students
-    response_rate_table = get_table_with(tables, 'Responded')
+    response_rate_table = by_header.get('Responded')
     assert response_rate_table
     num_responded = response_rate_table.find_all('td')[0].text
     num_students = response_rate_table.find_all('td')[1].text
 
     # course score
-    course_score_table = get_table_with(tables, 'Evaluate the course overall.')
+    course_score_table = by_header.get('Evaluate the course overall.')
     assert course_score_table
     course_score_rows = course_score_table.tr.find_all('td')
     course_score_stats = get_stats(course_score_rows)
 
     # lecturer score
-    lecturer_score_table = get_table_with(tables, 'Evaluate your Instructor overall.')
+    lecturer_score_table = by_header.get('Evaluate your Instructor overall.')
     if lecturer_score_table:
         lecturer_score_rows = lecturer_score_table.tr.find_all('td')
         lecturer_score_stats = get_stats(lecturer_score_rows)
@@ -111,7 +270,7 @@ def analyze(unique_code):
         lecturer_score_stats = [0, 0, 0, -1]
 
     # workload
-    workload_score_table = get_table_with(tables, 'Response Count')
+    workload_score_table = by_header.get('Response Count')
     if workload_score_table:
         workload_rows = workload_score_table.find_all('td')
         workload_stats = process_rows(workload_rows)[-4:]
@@ -123,26 +282,23 @@ def analyze(unique_code):
 
     # recommendation
     rec_freqs = []
-    first_rec_table = get_table_with(tables, 'Recommend with Enthusiasm')
+    first_rec_table = by_header.get('Recommend with Enthusiasm')
     assert first_rec_table
     for row in first_rec_table.find_all('tr'):
         rec_freqs.append(int(row.find_all('td')[1].text))
     rec_freqs.reverse()
-    recs = []
-    for i in range(5):
-        recs += [i + 1] * rec_freqs[i]
-    second_rec_table = get_table_with(tables, 'Response Ratio')
+    rec_freqs = rec_freqs[:5]
+    second_rec_table = by_header.get('Response Ratio')
     assert second_rec_table
     rec_rows = second_rec_table.find_all('td')
     rec_stats = process_rows(rec_rows)[-3:]
     rec_stats = [str(-1) if x in ['N/A','NRP'] else x for x in rec_stats]
     rec_stats = [float(x) for x in rec_stats]
-    if not recs:
+    if sum(rec_freqs) == 0:
         # empty rec scores
         num_errors += 1
         error_codes.append(unique_code)
-        return []
-    rec_stats.insert(2, statistics.mode(recs))
+        return None
 
     # comments
     max_sent_score = 0
@@ -156,23 +312,23 @@ def analyze(unique_code):
         gem_stats = [0, 0, 0, -1]
     else:
         comments = [x.text for x in tables[-1].find_all('td')]
-        sentiment_scores = []
-        gem_probabilities = []
-        for comment in comments:
-            sentiment_score = sia.polarity_scores(comment)['compound']
-            sentiment_scores.append(sentiment_score)
-            if sentiment_score > max_sent_score:
-                max_sent_score = sentiment_score
-                best_comment = comment
-            if sentiment_score < min_sent_score:
-                min_sent_score = sentiment_score
-                worse_comment = comment
-
-            gem_probability = get_gem_probability(comment)
-            gem_probabilities.append(gem_probability)
-            if gem_probability > 0 and sentiment_score > 0 and sentiment_score > max_gem_sentiment:
-                max_gem_sentiment = sentiment_score
-                best_gem_comment = comment
+        count('comments', len(comments))
+        with timer('sentiment'):
+            sentiment_scores = sentiment.compound_many(comments)
+            gem_probabilities = []
+            for comment, sentiment_score in zip(comments, sentiment_scores):
+                if sentiment_score > max_sent_score:
+                    max_sent_score = sentiment_score
+                    best_comment = comment
+                if sentiment_score < min_sent_score:
+                    min_sent_score = sentiment_score
+                    worse_comment = comment
+
+                gem_probability = get_gem_probability(comment)
+                gem_probabilities.append(gem_probability)
+                if gem_probability > 0 and sentiment_score > 0 and sentiment_score > max_gem_sentiment:
+                    max_gem_sentiment = sentiment_score
+                    best_gem_comment = comment
 
         gem_stats = [statistics.mean(gem_probabilities),
                      statistics.median(gem_probabilities),
@@ -194,82 +350,188 @@ def analyze(unique_code):
     # Format: FAS-156950-2248-F2-1-001(Kehayova) -> 156950
     course_id = unique_code.split('-')[1]
 
-    return [
-        unique_code,
-        course_id,
-        num_responded,
-        num_students,
-        *course_score_stats,
-        *lecturer_score_stats,
-        *workload_stats,
-        *rec_stats,
-        *sentiment_stats,
-        *gem_stats,
-        best_comment,
-        max_sent_score,
-        worse_comment,
-        min_sent_score,
-        best_gem_comment,
-        max_gem_sentiment
-    ]
-
-
-# demo or debug
-# print(analyze('FAS-156950-2248-F2-1-001(Kehayova)'))
-
-df = pd.read_csv('courses.csv')
-unique_codes = df.unique_code.tolist()
-stats = []
-for code in tqdm(unique_codes):
-    stats.append(analyze(code))
-print("num_errors: " + str(num_errors))
-
-# Print the first 10 error codes if any errors exist
-if num_errors > 0:
-    print("\nFirst 10 error codes:")
-    for code in error_codes[:10]:
-        print(code)
-
-df2 = pd.DataFrame(stats, columns=[
-    'unique_code',
-    'course_id',
-    "num_responded",
-    "num_students",
-    "course_score_mean",
-    "course_score_median",
-    "course_score_mode",
-    "course_score_stdev",
-    "lecturer_score_mean",
-    "lecturer_score_median",
-    "lecturer_score_mode",
-    "lecturer_score_stdev",
-    "workload_score_mean",
-    "workload_score_median",
-    "workload_score_mode",
-    "workload_score_stdev",
-    "rec_score_mean",
-    "rec_score_median",
-    "rec_score_mode",
-    "rec_score_stdev",
-    "sentiment_score_mean",
-    "sentiment_score_median",
-    "sentiment_score_mode",
-    "sentiment_score_stdev",
-    "gem_probability_mean",
-    "gem_probability_median",
-    "gem_probability_mode",
-    "gem_probability_stdev",
-    "best_comment",
-    "max_sent_score",
-    "worse_comment",
-    "min_sent_score",
-    "best_gem_comment",
-    "max_gem_probability"
-])
-
-df3 = pd.merge(df, df2, on='unique_code')
-df3.to_csv('course_ratings.csv', index=False)
-
-with open('gem_sentences.txt', 'w') as file:
-    for tup in possible_gem_sentences:
-        file.write(': '.join(map(str, tup)) + '\n')
+    fields = dict(
+        unique_code=unique_code,
+        course_id=course_id,
+        num_responded=num_responded,
+        num_students=num_students,
+        best_comment=best_comment,
+        max_sent_score=max_sent_score,
+        worse_comment=worse_comment,
+        min_sent_score=min_sent_score,
+        best_gem_comment=best_gem_comment,
+        max_gem_probability=max_gem_sentiment,
+    )
+    scores = {
+        'course_score': course_score_stats,
+        'lecturer_score': lecturer_score_stats,
+        'workload_score': workload_stats,
+        'sentiment_score': sentiment_stats,
+        'gem_probability': gem_stats,
+    }
+    return PendingRating(fields, scores, rec_stats, rec_freqs)
+
+
+def finish_ratings(pending):
+    # turn the read_rating() results of many courses into Ratings (None stays None)
+    # every histogram goes through a single histogram_stats call, and every
+    # recommendation mode through a single histogram_mode call, instead of one call
+    # per course, whose numpy overhead costs more than the statistics themselves
+    read = [rating for rating in pending if rating is not None]
+    histograms = [(rating, prefix) for rating in read
+                  for prefix, stats in rating.scores.items() if isinstance(stats, Histogram)]
+    if histograms:
+        computed = histogram_stats([rating.scores[prefix].freqs for rating, prefix in histograms])
+        for (rating, prefix), (median, mode, stdev) in zip(histograms, computed):
+            rating.scores[prefix] = [rating.scores[prefix].mean, median, mode, stdev]
+    rec_modes = histogram_mode([rating.rec_freqs for rating in read]) if read else []
+
+    ratings = []
+    rec_modes = iter(rec_modes)
+    for rating in pending:
+        if rating is None:
+            ratings.append(None)
+            continue
+        rec_stats = list(rating.rec_stats)
+        rec_stats.insert(2, next(rec_modes))
+        ratings.append(Rating(
+            **rating.fields,
+            **{field: value for prefix, stats in rating.scores.items()
+               for field, value in stat_fields(prefix, stats).items()},
+            **stat_fields('rec_score', rec_stats),
+        ))
+    return ratings
+
+
+def analyze_shard(unique_codes, pages=None):
+    # analyze a contiguous slice of the courses, from pages (their raw bytes) if given
+    # in a worker process the module globals are that worker's own state,
+    # so reset them per course and hand everything back to the parent,
+    # together with the shard's timings and counters
+    # the histogram statistics of the whole shard are computed together at the end
+    global num_errors, error_codes, possible_gem_sentences
+    pending = []
+    errors = []
+    gem_sentences = []
+    with collect() as shard_metrics:
+        for i, code in enumerate(unique_codes):
+            num_errors = 0
+            error_codes = []
+            possible_gem_sentences = []
+            pending.append(read_rating(code, pages[i] if pages else None))
+            errors.append(bool(error_codes))
+            gem_sentences.append(possible_gem_sentences)
+        rows = finish_ratings(pending)
+    results = list(zip(rows, errors, gem_sentences))
+    return results, shard_metrics.snapshot()
+
+
+def analyze_all(unique_codes, workers=None, cache=None):
+    # shard the courses across worker processes and merge the results
+    # shards are merged in submission order, so the rows, error codes and gem
+    # sentences come out in the same order as a serial run
+    # with a cache, only pages that are new or changed since the last run are analyzed
+    results = {}
+    digests = {}
+    if cache:
+        digests = {code: page_digest(code, store=get_store()) for code in unique_codes}
+        results = cache.get_many(digests)
+        print(f"Reusing {len(results)} cached courses")
+        count('cache_hits', len(results))
+    todo = [code for code in unique_codes if code not in results]
+
+    workers = workers or os.cpu_count() or 1
+    shard_size = max(1, math.ceil(len(todo) / (workers * 8)))
+    shards = [todo[i:i + shard_size] for i in range(0, len(todo), shard_size)]
+
+    if workers == 1:
+        shard_results = list(tqdm(map(analyze_shard, shards), total=len(shards), unit='shard'))
+    else:
+        # each worker loads the VADER lexicon and the page store index once, up front
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(store_path,)) as executor:
+            shard_results = list(tqdm(executor.map(analyze_shard, shards), total=len(shards), unit='shard'))
+
+    fresh = {}
+    for shard, (shard_result, shard_metrics) in zip(shards, shard_results):
+        fresh.update(zip(shard, shard_result))
+        get_metrics().merge(shard_metrics)
+    count('analyzed', len(fresh))
+    if cache:
+        cache.put_many((code, digests[code], *result) for code, result in fresh.items())
+    results.update(fresh)
+    return gather_results(unique_codes, results)
+
+
+def gather_results(unique_codes, results):
+    # put the (row, error, gem_sentences) of every course in courses.csv order
+    # courses that could not be analyzed have no row; cached rows come back as lists
+    stats = []
+    all_error_codes = []
+    all_gem_sentences = []
+    for code in unique_codes:
+        row, error, gem_sentences = results[code]
+        if row:
+            stats.append(Rating._make(row))
+        if error:
+            all_error_codes.append(code)
+            count('errors')
+        all_gem_sentences += gem_sentences
+    return stats, all_error_codes, all_gem_sentences
+
+
+def main(workers=None, use_cache=True, output_formats=("csv",), raw_store='raw_pages'):
+    global store_path
+    check_formats(output_formats)
+    store_path = raw_store
+    df = pd.read_csv('courses.csv')
+    unique_codes = df.unique_code.tolist()
+    cache = AnalysisCache(version=ANALYSIS_VERSION) if use_cache else None
+    try:
+        stats, all_error_codes, all_gem_sentences = analyze_all(unique_codes, workers, cache)
+    finally:
+        if cache:
+            cache.close()
+    write_results(df, stats, all_error_codes, all_gem_sentences, output_formats)
+
+    # time per stage summed over all workers, saved to run_summary_analyzer.json
+    write_summary('analyzer', workers=workers or os.cpu_count(), courses=len(unique_codes))
+
+
+def write_results(df, stats, all_error_codes, all_gem_sentences, output_formats=("csv",)):
+    # course_ratings.csv (courses.csv joined with the analysis) and gem_sentences.txt
+    print("num_errors: " + str(len(all_error_codes)))
+
+    # Print the first 10 error codes if any errors exist
+    if all_error_codes:
+        print("\nFirst 10 error codes:")
+        for code in all_error_codes[:10]:
+            print(code)
+
+    # typed by the schema, so float columns print the same whether or not a course failed
+    df2 = records_frame(stats, COLUMNS, QGUIDE_SCHEMA)
+
+    df3 = pd.merge(df, df2, on='unique_code')
+    with timer('write'):
+        write_table(df3, 'course_ratings.csv', QGUIDE_SCHEMA, output_formats)
+
+        with open('gem_sentences.txt', 'w') as file:
+            for tup in all_gem_sentences:
+                file.write(': '.join(map(str, tup)) + '\n')
+
+
+if __name__ == "__main__":
+    # demo or debug
+    # print(analyze('FAS-156950-2248-F2-1-001(Kehayova)'))
+
+    # number of worker processes, set to 1 to analyze serially
+    workers = os.cpu_count()
+    # set to False to ignore analysis_cache.sqlite and re-analyze every page
+    use_cache = True
+    # add "parquet" to also write a typed course_ratings.parquet (needs pyarrow)
+    output_formats = ["csv"]
+    # page store the downloaders saved to, QGuides missing from it are read from QGuides/
+    raw_store = 'raw_pages'
+    # set PIPELINE_PROFILE=cprofile to profile the run (with workers = 1 to see the analysis itself)
+    with profiled('analyzer'):
+        main(workers, use_cache, output_formats, raw_store)
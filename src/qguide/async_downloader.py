@@ -0,0 +1,122 @@
+# asyncio version of downloader.py
+# every request goes through one pooled keep-alive httpx client, a semaphore caps
+# the number of requests in flight and retries back off without blocking a thread;
+# pages are written to disk on worker threads, off the event loop
+# the QGuides are written to the same page store (or QGuides/<unique_code>.html)
+# and recorded in the same download manifest as downloader.py, so either one can
+# resume the other's run
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+import httpx
+from tqdm import tqdm
+
+from downloader import preprocess_qlinks, read_cookie
+from manifest import DownloadManifest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.instrumentation import count, get_metrics, profiled, timer, write_summary  # noqa: E402
+from common.page_store import PageStore  # noqa: E402
+
+
+async def fetch_qguide(client, semaphore, manifest, package, max_retries=5, base_delay=1):
+    # download one QGuide and return the number of bytes written
+    url, filename = package
+    for attempt in range(max_retries):
+        http_status = None
+        try:
+            # time spent waiting for a free slot shows whether concurrency is the bottleneck
+            queued_at = time.perf_counter()
+            async with semaphore:
+                get_metrics().add_time('queue', time.perf_counter() - queued_at)
+                with timer('network'):
+                    page = await client.get(url)
+            count('bytes_downloaded', len(page.content))
+            http_status = page.status_code
+            page.raise_for_status()
+            # compressing and writing the page happens on a worker thread, so the
+            # event loop keeps serving the other requests meanwhile
+            with timer('write'):
+                data = await asyncio.to_thread(manifest.save_page, filename, page.text, http_status)
+            count('downloaded')
+            return len(data)
+        except (httpx.HTTPError, IOError) as e:
+            if attempt == max_retries - 1:
+                count('failed')
+                tqdm.write(f"Failed to download {filename} after {max_retries} attempts: {e}")
+                await asyncio.to_thread(manifest.record, filename, 'failed', http_status=http_status)
+                raise
+            # exponential backoff with jitter so retries don't arrive in lockstep
+            delay = base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+            count('retries')
+            tqdm.write(f"Error downloading {filename} (attempt {attempt + 1}/{max_retries}): {e}. "
+                       f"Retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+
+async def download_all(packages, cookie, concurrency=50, timeout=60, manifest=None,
+                       max_retries=5, base_delay=1):
+    # download every [url, unique_code] package and return the unique codes that failed
+    manifest = manifest or DownloadManifest()
+    if manifest.store is None:
+        os.makedirs(manifest.folder, exist_ok=True)
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    failed = []
+    async with httpx.AsyncClient(headers={'Cookie': cookie}, limits=limits, timeout=timeout,
+                                 follow_redirects=True) as client:
+        tasks = {
+            asyncio.create_task(fetch_qguide(client, semaphore, manifest, package, max_retries, base_delay)): package
+            for package in packages
+        }
+        with tqdm(total=len(tasks), desc="Downloading QGuides", unit="file") as pbar:
+            for task in asyncio.as_completed(tasks):
+                try:
+                    await task
+                except Exception:
+                    pass
+                pbar.update(1)
+    for task, package in tasks.items():
+        if task.exception():
+            failed.append(package[1])
+    return failed
+
+
+def main(concurrency=50, raw_store='raw_pages'):
+    packages = preprocess_qlinks()
+    # Uncomment line below to test code with smaller sample
+    # packages = packages[:10]
+    # Only fetch QGuides that are missing or failed on a previous run
+    manifest = DownloadManifest(store=PageStore(raw_store) if raw_store else None)
+    total = len(packages)
+    packages = [package for package in packages if manifest.needs_download(package[1])]
+    if len(packages) < total:
+        print(f"Skipping {total - len(packages)} QGuides already downloaded")
+    cookie = read_cookie()
+
+    print(f"Starting download of {len(packages)} files with {concurrency} concurrent requests...")
+    start_time = time.time()
+    failed = asyncio.run(download_all(packages, cookie, concurrency, manifest=manifest))
+    total_time = time.time() - start_time
+    print(f"\nDownload complete! {len(packages) - len(failed)}/{len(packages)} files downloaded "
+          f"in {total_time:.1f}s ({total_time/60:.1f}m)")
+    if failed:
+        print("Failed downloads:")
+        for code in failed:
+            print(code)
+    # time per stage, bytes and retries, saved to run_summary_async_downloader.json
+    write_summary('async_downloader', concurrency=concurrency, files=len(packages))
+
+
+if __name__ == "__main__":
+    # number of requests in flight at once
+    concurrency = 50
+    # compressed store the pages are saved to, set to None for plain QGuides/<unique_code>.html files
+    raw_store = 'raw_pages'
+    # set PIPELINE_PROFILE=cprofile to profile the run
+    with profiled('async_downloader'):
+        main(concurrency, raw_store)
@@ -1,49 +1,54 @@
-# downloads q guides and put them in the folder QGuides
+# downloads q guides and put them in the compressed page store raw_pages/
+# (or the folder QGuides, with raw_store = None)
 
 import concurrent.futures
 import os
+import sys
 import time
-import threading
 
 import pandas as pd
 import requests
+from tqdm import tqdm
 
-PACKAGES = []
+from manifest import DownloadManifest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.adaptive import AdaptiveLimiter  # noqa: E402
+from common.instrumentation import count, profiled, timer, write_summary  # noqa: E402
+from common.page_store import PageStore  # noqa: E402
 
 
 def preprocess_qlinks():
+    # [link, unique_code] of every QGuide in courses.csv
     df = pd.read_csv('courses.csv')
     urls = df.link.tolist()
     unique_codes = df.unique_code.tolist()
+    packages = []
     for i in range(len(urls)):
-        PACKAGES.append([urls[i], unique_codes[i]])
+        packages.append([urls[i], unique_codes[i]])
+    return packages
 
 
-preprocess_qlinks()
-# Uncomment line below to test code with smaller sample
-# PACKAGES = PACKAGES[:10]
-global_count = 0
-count_lock = threading.Lock()
 start_time = None
+cookie = None
+manifest = None
+limiter = None
 
-# Create the QGuide folder if not exist
-if not os.path.exists('QGuides'):
-    os.makedirs('QGuides')
 
-# Choose any QGuide link, visit it on your browser, then open DevTools (Applications pane)
-# to copy everything in the cookie field
-# There should be three cookies: ASP.NET_SessionId, CookieName, and session_token
-# Copy paste the entire cookie string into secret_cookie.txt as one line.
-# You should create the secret cookie file
-# the file should looke like
-# "ASP.NET_SessionId=value; CookieName=value2; session_token=value3"
-with open('secret_cookie.txt', 'r') as f:
-    cookie = f.read()
+def read_cookie():
+    # Choose any QGuide link, visit it on your browser, then open DevTools (Applications pane)
+    # to copy everything in the cookie field
+    # There should be three cookies: ASP.NET_SessionId, CookieName, and session_token
+    # Copy paste the entire cookie string into secret_cookie.txt as one line.
+    # You should create the secret cookie file
+    # the file should looke like
+    # "ASP.NET_SessionId=value; CookieName=value2; session_token=value3"
+    with open('secret_cookie.txt', 'r') as f:
+        return f.read()
 
 
-# Retrieve a single page and report the URL and contents
+# Retrieve a single page, save it and return its bytes
 def load_url(package, timeout):
-    global global_count, start_time
     url = package[0]
     filename = package[1]
     headers = {
@@ -55,67 +60,97 @@ def load_url(package, timeout):
     base_delay = 1  # Start with 1 second
     
     for attempt in range(max_retries):
+        http_status = None
         try:
-            page = requests.get(url, headers=headers, timeout=timeout)
+            # the shared limiter grows or shrinks the number of requests in flight
+            # with how the server copes, and pauses everyone on a Retry-After
+            with limiter.slot() as slot:
+                with timer('network'):
+                    page = requests.get(url, headers=headers, timeout=timeout)
+                slot.record(page.status_code, page.headers.get('Retry-After'))
+            count('bytes_downloaded', len(page.content))
+            http_status = page.status_code
             page.raise_for_status()  # Raise an exception for bad status codes
             
-            with open('QGuides/' + filename + '.html', 'w') as f:
-                f.write(page.text)
+            # written atomically and recorded in the manifest
+            with timer('write'):
+                data = manifest.save_page(filename, page.text, http_status)
+            count('downloaded')
             
-            # Success - break out of retry loop
-            break
+            # Success - return the page bytes as saved
+            return data
             
         except (requests.RequestException, IOError) as e:
             if attempt < max_retries - 1:
                 # Calculate exponential backoff delay
                 delay = base_delay * (2 ** attempt)
-                print(f"Error downloading {filename} (attempt {attempt + 1}/{max_retries}): {e}")
-                print(f"Retrying in {delay}s...")
-                time.sleep(delay)
+                count('retries')
+                tqdm.write(f"Error downloading {filename} (attempt {attempt + 1}/{max_retries}): {e}")
+                tqdm.write(f"Retrying in {delay}s...")
+                with timer('backoff'):
+                    time.sleep(delay)
             else:
                 # Final attempt failed
-                print(f"Failed to download {filename} after {max_retries} attempts: {e}")
+                count('failed')
+                tqdm.write(f"Failed to download {filename} after {max_retries} attempts: {e}")
+                manifest.record(filename, 'failed', http_status=http_status)
                 raise
-    
-    with count_lock:
-        global_count += 1
-        elapsed_time = time.time() - start_time
-        progress_percent = global_count / len(PACKAGES) * 100
-        
-        # Calculate ETA
-        if global_count > 0:
-            avg_time_per_file = elapsed_time / global_count
-            remaining_files = len(PACKAGES) - global_count
-            eta_seconds = avg_time_per_file * remaining_files
-            
-            # Format ETA
-            if eta_seconds < 60:
-                eta_str = f"{eta_seconds:.0f}s"
-            elif eta_seconds < 3600:
-                eta_str = f"{eta_seconds/60:.1f}m"
-            else:
-                eta_str = f"{eta_seconds/3600:.1f}h"
-            
-            print(f"Progress: {global_count}/{len(PACKAGES)} ({progress_percent:.1f}%) | "
-                  f"Elapsed: {elapsed_time:.1f}s | ETA: {eta_str}")
 
 
-# We can use a with statement to ensure threads are cleaned up promptly
-print(f"Starting download of {len(PACKAGES)} files with 50 concurrent threads...")
-start_time = time.time()
+def main(max_concurrency=64, raw_store='raw_pages'):
+    global cookie, start_time, manifest, limiter
+    packages = preprocess_qlinks()
+    # Uncomment line below to test code with smaller sample
+    # packages = packages[:10]
 
-with concurrent.futures.ThreadPoolExecutor(max_workers=50) as executor:
-    # Start the load operations and mark each future with its URL
-    future_to_url = {executor.submit(load_url, url, 60): url for url in PACKAGES}
-    for future in concurrent.futures.as_completed(future_to_url):
-        url = future_to_url[future]
-        try:
-            data = future.result()
-        except Exception as exc:
-            print('%r generated an exception: %s' % (url, exc))
-        else:
-            pass
-            # print('%r page is %d bytes' % (url, len(data)))
-    
-    total_time = time.time() - start_time
-    print(f"\nDownload complete! {len(PACKAGES)} files downloaded in {total_time:.1f}s ({total_time/60:.1f}m)")
+    # Create the QGuide folder if not exist
+    if not raw_store and not os.path.exists('QGuides'):
+        os.makedirs('QGuides')
+
+    # Only fetch QGuides that are missing or failed on a previous run
+    manifest = DownloadManifest(store=PageStore(raw_store) if raw_store else None)
+    total = len(packages)
+    packages = [package for package in packages if manifest.needs_download(package[1])]
+    if len(packages) < total:
+        print(f"Skipping {total - len(packages)} QGuides already downloaded")
+
+    cookie = read_cookie()
+
+    # start with a few requests in flight and let the limiter find how many the server takes
+    limiter = AdaptiveLimiter(initial=4, maximum=max_concurrency)
+
+    # We can use a with statement to ensure threads are cleaned up promptly
+    print(f"Starting download of {len(packages)} files with up to {max_concurrency} concurrent requests...")
+    start_time = time.time()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        # Start the load operations and mark each future with its URL
+        future_to_url = {executor.submit(load_url, url, 60): url for url in packages}
+        with tqdm(total=len(future_to_url), desc="Downloading QGuides", unit="file") as pbar:
+            for future in concurrent.futures.as_completed(future_to_url):
+                url = future_to_url[future]
+                try:
+                    data = future.result()
+                except Exception as exc:
+                    tqdm.write('%r generated an exception: %s' % (url, exc))
+                else:
+                    pass
+                    # print('%r page is %d bytes' % (url, len(data)))
+                pbar.update(1)
+
+        total_time = time.time() - start_time
+        print(f"\nDownload complete! {len(packages)} files downloaded in {total_time:.1f}s ({total_time/60:.1f}m)")
+    # time per stage, bytes and retries, saved to run_summary_downloader.json
+    write_summary('downloader', max_concurrency=max_concurrency, files=len(packages),
+                  peak_concurrency=int(limiter.peak_limit),
+                  final_concurrency=limiter.concurrency)
+
+
+if __name__ == "__main__":
+    # set PIPELINE_PROFILE=cprofile to profile the run
+    # upper bound on requests in flight, the actual number adapts to the server
+    max_concurrency = 64
+    # compressed store the pages are saved to, set to None for plain QGuides/<unique_code>.html files
+    raw_store = 'raw_pages'
+    with profiled('downloader'):
+        main(max_concurrency, raw_store)
@@ -0,0 +1,86 @@
+# summary statistics straight from 5-bin score histograms
+# the QGuide reports, for each score from 1 to 5, how many responses (or what
+# percentage of them) gave that score; instead of expanding a histogram into one
+# list entry per response, compute the statistics from the count vectors,
+# for any number of courses at once
+# results are identical to statistics.median/mode/stdev on the expanded scores
+
+import math
+import statistics
+import sys
+
+import numpy as np
+
+SCORES = np.arange(1, 6)
+
+# bits of precision needed for a correctly rounded square root, _sqrt_bit_width in statistics
+_SQRT_BIT_WIDTH = 2 * sys.float_info.mant_dig + 3
+
+
+def _as_counts(counts):
+    counts = np.asarray(counts, dtype=np.int64)
+    if counts.ndim != 2 or counts.shape[1] != len(SCORES):
+        raise ValueError('counts must be a (courses, 5) array')
+    return counts
+
+
+# _integer_sqrt_of_frac_rto and _sqrt_of_frac are copies of the private
+# _integer_sqrt_of_frac_rto and _float_sqrt_of_frac of CPython 3.11's Lib/statistics.py
+# (pyproject.toml pins Python 3.11), which stdev rounds its result with;
+# tests/test_histogram_stats.py checks them against the originals
+def _integer_sqrt_of_frac_rto(n, m):
+    # square root of n / m rounded to an integer with round-to-odd
+    a = math.isqrt(n // m)
+    return a | (a * a * m != n)
+
+
+def _sqrt_of_frac(n, m):
+    # square root of n / m as a correctly rounded float, the same algorithm
+    # statistics.stdev uses, so the result matches it to the last bit
+    q = (n.bit_length() - m.bit_length() - _SQRT_BIT_WIDTH) // 2
+    if q >= 0:
+        numerator = _integer_sqrt_of_frac_rto(n, m << 2 * q) << q
+        denominator = 1
+    else:
+        numerator = _integer_sqrt_of_frac_rto(n << -2 * q, m)
+        denominator = 1 << -q
+    return numerator / denominator
+
+
+def histogram_mode(counts):
+    # most common score of each histogram, the lowest one on ties
+    counts = _as_counts(counts)
+    if (counts.sum(axis=1) == 0).any():
+        raise statistics.StatisticsError('no mode for empty data')
+    return [int(score) for score in SCORES[counts.argmax(axis=1)]]
+
+
+def histogram_stats(counts):
+    # [median, mode, stdev] of the scores of each histogram
+    counts = _as_counts(counts)
+    n = counts.sum(axis=1)
+    if (n < 2).any():
+        raise statistics.StatisticsError('stdev requires at least two data points')
+
+    # median: the score(s) at the middle position(s) of the sorted responses
+    cumulative = counts.cumsum(axis=1)
+    upper = SCORES[(cumulative <= (n // 2)[:, None]).sum(axis=1)]
+    lower = SCORES[(cumulative <= (n // 2 - 1)[:, None]).sum(axis=1)]
+
+    mode = histogram_mode(counts)
+
+    # sample variance as the exact fraction (n * sum(x^2) - sum(x)^2) / (n * (n - 1))
+    sum_x = counts @ SCORES
+    sum_xx = counts @ (SCORES * SCORES)
+    numerators = n * sum_xx - sum_x * sum_x
+    denominators = n * (n - 1)
+
+    stats = []
+    for i in range(len(counts)):
+        if n[i] % 2 == 1:
+            median = int(upper[i])
+        else:
+            median = (int(lower[i]) + int(upper[i])) / 2
+        stdev = _sqrt_of_frac(int(numerators[i]), int(denominators[i]))
+        stats.append([median, mode[i], stdev])
+    return stats
@@ -0,0 +1,90 @@
+# download manifest for the QGuides
+# every finished or failed download appends one JSON line to download_manifest.jsonl
+# recording its status, size, content hash, HTTP status and time, so a re-run
+# only fetches the pages that are missing or failed last time
+# with a PageStore (src/common/page_store.py) the pages go to the compressed
+# store instead of QGuides/<unique_code>.html
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def write_atomic(path, data):
+    # write bytes to a temp file next to path and rename it into place,
+    # so a crash never leaves a truncated file behind
+    folder = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.tmp-', suffix='.html')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class DownloadManifest:
+    def __init__(self, path='download_manifest.jsonl', folder='QGuides', store=None):
+        self.path = path
+        self.folder = folder
+        self.store = store
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a crash can cut the last line short
+                        continue
+                    # later lines win
+                    self.entries[entry['unique_code']] = entry
+
+    def file_path(self, unique_code):
+        return self.folder + '/' + unique_code + '.html'
+
+    def needs_download(self, unique_code):
+        entry = self.entries.get(unique_code)
+        if not entry or entry['status'] != 'ok':
+            return True
+        if self.store is not None and unique_code in self.store:
+            return False
+        return not os.path.exists(self.file_path(unique_code))
+
+    def record(self, unique_code, status, data=None, http_status=None):
+        entry = {
+            'unique_code': unique_code,
+            'status': status,
+            'bytes': len(data) if data is not None else None,
+            'sha256': hashlib.sha256(data).hexdigest() if data is not None else None,
+            'http_status': http_status,
+            'timestamp': time.time(),
+        }
+        with self.lock:
+            self.entries[unique_code] = entry
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def load_page(self, unique_code):
+        # bytes of a page saved earlier, from the store or QGuides/
+        if self.store is not None and unique_code in self.store:
+            return self.store.get_bytes(unique_code)
+        with open(self.file_path(unique_code), 'rb') as f:
+            return f.read()
+
+    def save_page(self, unique_code, text, http_status):
+        # atomically write a downloaded page and mark it done
+        data = text.encode('utf-8')
+        if self.store is not None:
+            self.store.put_bytes(unique_code, data)
+        else:
+            write_atomic(self.file_path(unique_code), data)
+        self.record(unique_code, 'ok', data, http_status)
+        return data
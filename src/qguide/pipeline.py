@@ -0,0 +1,208 @@
+# download the QGuides and analyze them in one run
+# download threads put the bytes of every saved page on a bounded queue and
+# analyzer worker processes take shards of pages off it, so the network-bound
+# download and the CPU-bound analysis overlap and a term takes about as long as
+# the slower of the two instead of their sum
+# when the analysis falls behind, the queue fills up and the download threads
+# block on it (backpressure), so at most queue_size pages wait in memory
+# course rows and errors are reported as each shard finishes, and the outputs
+# are the same as running downloader.py and then analyzer.py
+
+import concurrent.futures
+import hashlib
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+import pandas as pd
+from tqdm import tqdm
+
+import analyzer
+import downloader
+from analysis_cache import AnalysisCache, page_digest
+from manifest import DownloadManifest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.adaptive import AdaptiveLimiter  # noqa: E402
+from common.columnar import check_formats  # noqa: E402
+from common.instrumentation import count, get_metrics, profiled, timer, write_summary  # noqa: E402
+from common.page_store import PageStore  # noqa: E402
+
+# result of a course whose page could not be downloaded, counted as an error
+FAILED = (None, True, [])
+
+
+def produce(packages, manifest, pages, stop, max_concurrency):
+    # download every [url, unique_code] package (or read it back if it was downloaded
+    # by an earlier run) and put (unique_code, bytes) on the pages queue,
+    # or (unique_code, None) when it failed
+    def put(item):
+        with timer('queue_wait'):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    pass
+
+    def fetch(package):
+        if stop.is_set():
+            return
+        unique_code = package[1]
+        try:
+            if manifest.needs_download(unique_code):
+                data = downloader.load_url(package, 60)
+            else:
+                data = manifest.load_page(unique_code)
+        except Exception:
+            # load_url has already reported it and recorded it in the manifest
+            data = None
+        put((unique_code, data))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        list(executor.map(fetch, packages))
+
+
+def worker_context():
+    # forkserver where the platform has it (Linux, macOS), spawn otherwise
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def run_pipeline(packages, manifest, workers=None, queue_size=256, shard_size=8, max_concurrency=64):
+    # yield (unique_code, (row, error, gem_sentences), digest) for every package as soon
+    # as it is analyzed, in completion order; digest is None for failed downloads
+    workers = workers or os.cpu_count() or 1
+    pages = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    producer = threading.Thread(target=produce, args=(packages, manifest, pages, stop, max_concurrency),
+                                daemon=True)
+    producer.start()
+
+    remaining = len(packages)
+    in_flight = {}
+    try:
+        # each worker loads the VADER lexicon and the page store index once, up front
+        # the download threads are already running, so workers are started from a
+        # forkserver rather than forked from this process, where a thread may hold a lock
+        # (stdout, tqdm, ssl) that the forked worker would then wait on forever
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=worker_context(),
+                                                    initializer=analyzer.init_worker,
+                                                    initargs=(analyzer.store_path,)) as executor:
+            while remaining or in_flight:
+                if remaining and len(in_flight) < 2 * workers:
+                    # wait for the next page, but only briefly while shards are in flight,
+                    # so their results are reported as soon as they are done
+                    shard = []
+                    try:
+                        shard.append(pages.get(timeout=0.05 if in_flight else None))
+                        while len(shard) < shard_size:
+                            shard.append(pages.get_nowait())
+                    except queue.Empty:
+                        pass
+                    remaining -= len(shard)
+
+                    downloaded = []
+                    for unique_code, data in shard:
+                        if data is None:
+                            count('download_failed')
+                            yield unique_code, FAILED, None
+                        else:
+                            downloaded.append((unique_code, data))
+                    if downloaded:
+                        codes, datas = zip(*downloaded)
+                        digests = [hashlib.sha256(data).hexdigest() for data in datas]
+                        future = executor.submit(analyzer.analyze_shard, list(codes), list(datas))
+                        in_flight[future] = (codes, digests)
+                    done = [future for future in in_flight if future.done()]
+                else:
+                    done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    codes, digests = in_flight.pop(future)
+                    shard_result, shard_metrics = future.result()
+                    get_metrics().merge(shard_metrics)
+                    count('analyzed', len(codes))
+                    yield from zip(codes, shard_result, digests)
+    finally:
+        # unblock the download threads if the analysis stopped early
+        stop.set()
+        producer.join()
+
+
+def main(max_concurrency=64, workers=None, queue_size=256, use_cache=True, output_formats=("csv",),
+         raw_store='raw_pages'):
+    check_formats(output_formats)
+    df = pd.read_csv('courses.csv')
+    unique_codes = df.unique_code.tolist()
+    # courses listed twice are downloaded and analyzed once
+    packages = list({package[1]: package for package in downloader.preprocess_qlinks()}.values())
+
+    store = PageStore(raw_store) if raw_store else None
+    manifest = DownloadManifest(store=store)
+    if store is None:
+        os.makedirs(manifest.folder, exist_ok=True)
+    # load_url works on the downloader's globals
+    downloader.manifest = manifest
+    downloader.cookie = downloader.read_cookie()
+    downloader.limiter = AdaptiveLimiter(initial=4, maximum=max_concurrency)
+    analyzer.store_path = raw_store
+
+    cache = AnalysisCache(version=analyzer.ANALYSIS_VERSION) if use_cache else None
+    results = {}
+    try:
+        if cache:
+            # pages already downloaded and analyzed by an earlier run are neither fetched nor analyzed
+            digests = {package[1]: page_digest(package[1], manifest.folder, store)
+                       for package in packages if not manifest.needs_download(package[1])}
+            results = cache.get_many(digests)
+            print(f"Reusing {len(results)} cached courses")
+            count('cache_hits', len(results))
+        todo = [package for package in packages if package[1] not in results]
+
+        print(f"Downloading and analyzing {len(todo)} QGuides...")
+        start_time = time.time()
+        with tqdm(total=len(todo), desc="Downloading and analyzing", unit="course") as pbar:
+            for unique_code, result, digest in run_pipeline(todo, manifest, workers, queue_size,
+                                                            max_concurrency=max_concurrency):
+                results[unique_code] = result
+                if result[1]:
+                    tqdm.write(f"ERROR: {unique_code}")
+                # cached as it finishes, so a re-run after a crash picks up where this one stopped
+                if cache and digest:
+                    cache.put_many([(unique_code, digest, *result)])
+                pbar.update(1)
+        total_time = time.time() - start_time
+        print(f"\nDone in {total_time:.1f}s ({total_time/60:.1f}m)")
+    finally:
+        if cache:
+            cache.close()
+
+    stats, all_error_codes, all_gem_sentences = analyzer.gather_results(unique_codes, results)
+    analyzer.write_results(df, stats, all_error_codes, all_gem_sentences, output_formats)
+    # download and analysis stages (summed over threads and workers), saved to run_summary_pipeline.json
+    write_summary('pipeline', max_concurrency=max_concurrency, workers=workers or os.cpu_count(),
+                  queue_size=queue_size, courses=len(unique_codes),
+                  peak_concurrency=int(downloader.limiter.peak_limit))
+
+
+if __name__ == "__main__":
+    # upper bound on requests in flight, the actual number adapts to the server
+    max_concurrency = 64
+    # number of analyzer worker processes
+    workers = os.cpu_count()
+    # pages downloaded but not yet analyzed, downloads wait when this many are queued
+    queue_size = 256
+    # set to False to re-analyze every page instead of reusing analysis_cache.sqlite
+    use_cache = True
+    # add "parquet" to also write a typed course_ratings.parquet (needs pyarrow)
+    output_formats = ["csv"]
+    # compressed store the pages are saved to, set to None for plain QGuides/<unique_code>.html files
+    raw_store = 'raw_pages'
+    # set PIPELINE_PROFILE=cprofile to profile the run
+    with profiled('pipeline'):
+        main(max_concurrency, workers, queue_size, use_cache, output_formats, raw_store)
@@ -0,0 +1,42 @@
+# VADER sentiment scoring for the QGuide comments
+# the analyzer and its lexicon are loaded once per process, on first use, and
+# scores are memoized on the normalized text, so comments repeated across
+# cross-listed courses and the sentences re-scored for gems are only scored once
+
+from functools import lru_cache
+
+_sia = None
+
+
+def get_analyzer():
+    global _sia
+    if _sia is None:
+        # you might need to uncomment the below
+        # import nltk
+        # nltk.download('vader_lexicon')
+        from nltk.sentiment import SentimentIntensityAnalyzer
+        _sia = SentimentIntensityAnalyzer()
+    return _sia
+
+
+def normalize(text):
+    # VADER only ever looks at the text split on whitespace (plus '!' and '?' counts),
+    # so collapsing whitespace changes the cache key but never the score
+    return ' '.join(text.split())
+
+
+@lru_cache(maxsize=2 ** 16)
+def _compound(normalized_text):
+    return get_analyzer().polarity_scores(normalized_text)['compound']
+
+
+def compound(text):
+    # VADER compound score of a single text
+    return _compound(normalize(text))
+
+
+def compound_many(texts):
+    # score a batch of texts, scoring each distinct normalized text only once
+    normalized = [normalize(text) for text in texts]
+    scores = {text: _compound(text) for text in dict.fromkeys(normalized)}
+    return [scores[text] for text in normalized]
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# The stage scripts import their neighbours by module name from their own folder
+# (import analyzer, from combine import ...), and common/ from src/
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+REPO_ROOT = os.path.abspath(os.path.join(SRC_DIR, ".."))
+
+for folder in ("qguide", "myharvard", "hugems"):
+    sys.path.insert(0, os.path.join(SRC_DIR, folder))
+sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from async_downloader import download_all
+from common.page_store import PageStore
+from manifest import DownloadManifest
+
+
+class StubQGuides(BaseHTTPRequestHandler):
+    # /ok/<code> serves a page, /flaky/<code> fails once with a 503 first,
+    # /missing/<code> is always a 404
+    attempts = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        kind, code = self.path.strip('/').split('/')
+        with self.lock:
+            self.attempts[self.path] = self.attempts.get(self.path, 0) + 1
+            attempt = self.attempts[self.path]
+        if kind == 'missing' or (kind == 'flaky' and attempt == 1):
+            self.send_response(404 if kind == 'missing' else 503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = f'<html><body><table><tbody><tr><th>{code}</th></tr></tbody></table>é</body></html>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StubQGuides.attempts = {}
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubQGuides)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.mark.parametrize('use_store', [False, True])
+def test_download_all(server, tmp_path, use_store):
+    store = PageStore(str(tmp_path / 'raw_pages')) if use_store else None
+    manifest = DownloadManifest(path=str(tmp_path / 'manifest.jsonl'), folder=str(tmp_path / 'QGuides'),
+                                store=store)
+    packages = [[f'{server}/ok/A{i}', f'A{i}'] for i in range(20)]
+    packages += [[f'{server}/flaky/B', 'B'], [f'{server}/missing/C', 'C']]
+
+    failed = asyncio.run(download_all(packages, 'cookie=1', concurrency=4, manifest=manifest,
+                                      max_retries=3, base_delay=0.01))
+
+    assert failed == ['C']
+    assert StubQGuides.attempts['/flaky/B'] == 2
+    assert StubQGuides.attempts['/missing/C'] == 3
+    for code in [f'A{i}' for i in range(20)] + ['B']:
+        assert not manifest.needs_download(code)
+        assert f'<th>{code}</th>' in manifest.load_page(code).decode('utf-8')
+    assert manifest.needs_download('C')
+
+    # a fresh manifest read back from disk agrees
+    reloaded = DownloadManifest(path=manifest.path, folder=manifest.folder, store=store)
+    assert reloaded.entries['B']['status'] == 'ok'
+    assert reloaded.entries['C']['status'] == 'failed'
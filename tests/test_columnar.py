@@ -0,0 +1,26 @@
+import pandas as pd
+
+from common.columnar import FLOAT, INTEGER, STRING, apply_schema, records_frame
+
+SCHEMA = {"unique_code": STRING, "num_students": INTEGER, "course_score_mean": FLOAT}
+COLUMNS = list(SCHEMA)
+
+
+def test_records_frame_types_columns():
+    df = records_frame([("A", "12", 4.5), ("B", None, 3.0)], COLUMNS, SCHEMA)
+    assert df.dtypes.astype(str).tolist() == ["string", "Int64", "float64"]
+    assert df["num_students"].tolist() == [12, pd.NA]
+    assert df.equals(apply_schema(records_frame([("A", "12", 4.5), ("B", None, 3.0)], COLUMNS), SCHEMA))
+
+
+def test_records_frame_keeps_non_numeric_integers_as_text():
+    # the QGuide can show "N/A" where a count is expected, which the CSV has always kept
+    df = records_frame([("A", "12", 4.5), ("B", "N/A", 3.0)], COLUMNS, SCHEMA)
+    assert df["num_students"].tolist() == ["12", "N/A"]
+    assert df.to_csv(index=False).splitlines()[2] == "B,N/A,3.0"
+
+
+def test_apply_schema_reads_non_numeric_values_as_missing():
+    df = apply_schema(pd.DataFrame({"num_students": ["12", "N/A", None]}), SCHEMA)
+    assert df["num_students"].dtype == INTEGER
+    assert df["num_students"].tolist() == [12, pd.NA, pd.NA]
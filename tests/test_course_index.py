@@ -0,0 +1,47 @@
+import os
+
+from conftest import REPO_ROOT
+from course_index import ARCHIVE_FOLDER, CourseIndex, find_archived_ratings
+
+# offered every term, spring and fall, since the first archived QGuide
+EVERY_TERM_COURSE = 108465
+
+
+def archived_terms():
+    # the QGuide term of every archived folder, a year before the release it was used for
+    terms = set()
+    for folder in os.listdir(os.path.join(REPO_ROOT, "archive")):
+        match = ARCHIVE_FOLDER.match(folder)
+        if match:
+            terms.add((int(match.group(2)) - 1, match.group(1).capitalize()))
+    return terms
+
+
+def test_every_archived_term_has_ratings():
+    found = {(int(year), term) for year, term in find_archived_ratings(REPO_ROOT)}
+    assert found == archived_terms()
+
+
+def test_history_covers_every_archived_term(tmp_path):
+    index = CourseIndex(str(tmp_path / "index.sqlite"))
+    try:
+        index.update(REPO_ROOT)
+        history = index.qguide_history(EVERY_TERM_COURSE)
+        terms = {(row["year"], row["term"]) for row in history}
+        assert archived_terms() <= terms
+        assert all(row["course_id"] == EVERY_TERM_COURSE for row in history)
+        # the archived course codes agree with the term they were filed under
+        strm = {"Spring": "2", "Fall": "8"}
+        for row in history:
+            assert row["unique_code"].split("-")[2] == f"2{row['year'] % 100}{strm[row['term']]}"
+    finally:
+        index.close()
+
+
+def test_unchanged_files_are_skipped(tmp_path):
+    index = CourseIndex(str(tmp_path / "index.sqlite"))
+    try:
+        assert index.update(REPO_ROOT)
+        assert index.update(REPO_ROOT) == {}
+    finally:
+        index.close()
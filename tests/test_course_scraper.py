@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from common.adaptive import AdaptiveLimiter
+from get_course_myharvard import CourseScraperPool
+
+COURSE_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "myharvard_course.html")
+
+
+class ThrottlingServer(BaseHTTPRequestHandler):
+    # serves the course page fixture at every /course/<n>, but answers the first
+    # request for /course/throttled with a 429 and a Retry-After of one second
+    page = b""
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.requests.append((self.path, time.monotonic()))
+            first = sum(path == self.path for path, _ in self.requests) == 1
+        if self.path == "/course/throttled" and first:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(self.page)))
+        self.end_headers()
+        self.wfile.write(self.page)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    with open(COURSE_PAGE, "rb") as f:
+        ThrottlingServer.page = f.read()
+    ThrottlingServer.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingServer)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_retry_after_backs_off_then_succeeds(server):
+    limiter = AdaptiveLimiter(initial=4, maximum=8)
+    urls = [f"{server}/course/throttled"] + [f"{server}/course/{i}" for i in range(6)]
+    with CourseScraperPool(max_workers=4, limiter=limiter) as pool:
+        results = dict(pool.scrape_many(urls))
+
+    # every course came back, including the throttled one on its second attempt
+    assert all(results[url] is not None for url in urls)
+    assert results[urls[0]].course_title == "Course number 7 & more"
+    throttled = [at for path, at in ThrottlingServer.requests if path == "/course/throttled"]
+    assert len(throttled) == 2
+    # the retry waited out the Retry-After, and the limiter left slow start
+    assert throttled[1] - throttled[0] >= 0.9
+    assert not limiter.slow_start
@@ -0,0 +1,58 @@
+import os
+
+import nltk
+import pandas as pd
+import pytest
+
+from export import build_exports, ensure_nltk_data, gem_columns
+
+
+def course(code, gem_probability, workload):
+    # a course with top scores and enough responses to be listed, without comments
+    return {
+        'course_code': code, 'course_title_2026': code.title(), 'course_id': code[-1],
+        'num_responded': 20, 'num_students': 20,
+        'course_score_median': 5, 'lecturer_score_median': 5, 'rec_score_median': 5,
+        'course_score_mean': 4.9, 'rec_score_mean': 4.9, 'sentiment_score_median': 0.9,
+        'gem_probability_mean': gem_probability, 'workload_score_mean': workload,
+        'best_gem_comment': '', 'best_comment': '', 'department': 'Dept', 'link': '',
+    }
+
+
+def listed(exports, name):
+    return exports[name]['course_code'].tolist()
+
+
+def test_courses_without_gem_probability_are_not_great_or_hidden():
+    df = pd.DataFrame([course('GEM 1', 0.5, 3), course('GREAT 2', 0.0, 6), course('HIDDEN 3', 0.0, 2),
+                       course('UNKNOWN 4', float('nan'), 6), course('UNKNOWN 5', float('nan'), 2)])
+    exports = build_exports(df, '2026')
+    assert listed(exports, 'super_gems.json') == ['GEM 1']
+    assert listed(exports, 'great_courses.json') == ['GREAT 2']
+    assert listed(exports, 'hidden_gems.json') == ['HIDDEN 3']
+    assert list(exports['super_gems.json'].columns) == gem_columns('2026')
+
+
+def test_courses_without_department_are_left_out_of_department_files():
+    # read_table returns text columns as StringDtype, where a missing department is pd.NA
+    df = pd.DataFrame([course('GEM 1', 0.5, 3), course('GEM 2', 0.6, 3)])
+    df['department'] = pd.array(['Dept', None], dtype='string')
+    exports = build_exports(df, '2026')
+    assert exports['department_list.json'] == ['Dept']
+    assert listed(exports, os.path.join('departments', 'Dept.json')) == ['GEM 1']
+    assert listed(exports, 'super_gems.json') == ['GEM 2', 'GEM 1']
+
+
+def test_missing_nltk_data_is_downloaded_or_explained(monkeypatch):
+    def missing(resource):
+        raise LookupError(resource)
+
+    downloaded = []
+    monkeypatch.setattr(nltk.data, 'find', missing)
+    monkeypatch.setattr(nltk, 'download', lambda package, quiet: downloaded.append(package) or True)
+    ensure_nltk_data()
+    assert downloaded == ['punkt', 'vader_lexicon']
+
+    monkeypatch.setattr(nltk, 'download', lambda package, quiet: False)
+    with pytest.raises(LookupError, match='python -m nltk.downloader punkt'):
+        ensure_nltk_data()
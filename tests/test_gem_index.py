@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+
+import numpy
+import pandas as pd
+import pytest
+
+from conftest import SRC_DIR
+from gem_index import GemIndex
+
+# seven courses in two departments and one without, ties on purpose:
+# ASTRO 2 and ASTRO 4 share a course score (4.8) and a gem probability (0.3),
+# ASTRO 3 has no gem probability
+COURSES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "gem_index_courses.csv")
+
+
+@pytest.fixture(scope="module")
+def index():
+    return GemIndex.from_frame(pd.read_csv(COURSES), "2026", ranked_only=False)
+
+
+def codes(index, rows):
+    return [record["course_code"] for record in index.rows(rows)]
+
+
+def test_loading_the_index_does_not_import_pandas_or_nltk():
+    # querying a saved index only needs numpy
+    code = "import sys, gem_index; print(sorted({'pandas', 'nltk'} & set(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=os.path.join(SRC_DIR, "hugems"),
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
+
+
+def test_top_per_department_and_key(index):
+    assert index.departments == ["Astronomy", "Biology"]
+    # k larger than the department, the course without a gem probability left out,
+    # equal scores in row order
+    assert codes(index, index.top("Astronomy", "gem_probability_mean", k=10)) == ["ASTRO 1", "ASTRO 2", "ASTRO 4"]
+    assert codes(index, index.top("Astronomy", "course_score_mean", k=2)) == ["ASTRO 2", "ASTRO 4"]
+    assert codes(index, index.top("Biology", "workload_score_mean", k=1)) == ["BIO 1"]
+    assert codes(index, index.top(None, "gem_probability_mean", k=3)) == ["ASTRO 1", "GEN 1", "BIO 1"]
+    with pytest.raises(KeyError):
+        index.top("Chemistry")
+
+
+def test_top_ascending_keeps_ties_in_row_order(index):
+    assert codes(index, index.top("Astronomy", "course_score_mean", k=10, ascending=True)) == \
+        ["ASTRO 3", "ASTRO 1", "ASTRO 2", "ASTRO 4"]
+    assert codes(index, index.top("Astronomy", "gem_probability_mean", ascending=True)) == \
+        ["ASTRO 2", "ASTRO 4", "ASTRO 1"]
+
+
+def test_top_with_ranges_and_gems_only(index):
+    found = index.top("Astronomy", ranges={"workload_score_mean": (None, 5)})
+    assert codes(index, found) == ["ASTRO 1", "ASTRO 4"]
+    assert codes(index, index.top(None, k=10, gems_only=True)) == ["ASTRO 1", "GEN 1", "BIO 1", "ASTRO 2", "ASTRO 4"]
+
+
+def test_between_includes_both_bounds(index):
+    assert codes(index, index.between("Astronomy", "workload_score_mean", 3, 5)) == ["ASTRO 3", "ASTRO 1"]
+    assert codes(index, index.between("Astronomy", "workload_score_mean", 3.5, 5)) == ["ASTRO 1"]
+    assert codes(index, index.between("Astronomy", "course_score_mean", 4.8, 4.8)) == ["ASTRO 2", "ASTRO 4"]
+    assert codes(index, index.between(None, "gem_probability_mean", 0.3, 0.5)) == ["ASTRO 2", "ASTRO 4", "BIO 1"]
+    assert codes(index, index.between("Biology", "gem_probability_mean", low=0.0)) == ["BIO 2", "BIO 1"]
+    # no bounds is every course with the score
+    assert codes(index, index.between("Astronomy", "gem_probability_mean")) == ["ASTRO 2", "ASTRO 4", "ASTRO 1"]
+
+
+def test_saved_index_answers_like_the_built_one(index, tmp_path):
+    path = str(tmp_path / "gem_index.bin")
+    index.save(path)
+    loaded = GemIndex.load(path)
+    assert isinstance(loaded.arrays["order_course_score_mean"].base, numpy.memmap)
+    assert loaded.departments == index.departments and loaded.records == index.records
+    for department in [None] + index.departments:
+        for key in ("course_score_mean", "workload_score_mean", "gem_probability_mean"):
+            for ascending in (False, True):
+                assert loaded.top(department, key, k=10, ascending=ascending).tolist() == \
+                    index.top(department, key, k=10, ascending=ascending).tolist()
+            assert loaded.between(department, key, 0.3, 5).tolist() == index.between(department, key, 0.3, 5).tolist()
@@ -0,0 +1,66 @@
+import random
+import statistics
+
+import pytest
+
+from histogram_stats import _integer_sqrt_of_frac_rto, _sqrt_of_frac, histogram_mode, histogram_stats
+
+
+def random_histograms(rng, count):
+    # percentages like the QGuide reports, and small or skewed response counts
+    histograms = []
+    for _ in range(count):
+        kind = rng.randrange(3)
+        if kind == 0:
+            cuts = sorted(rng.randint(0, 100) for _ in range(4))
+            histogram = [b - a for a, b in zip([0] + cuts, cuts + [100])]
+        elif kind == 1:
+            histogram = [rng.randint(0, 6) for _ in range(5)]
+        else:
+            histogram = [0] * 5
+            histogram[rng.randrange(5)] = rng.randint(0, 400)
+            histogram[rng.randrange(5)] += rng.randint(0, 3)
+        if sum(histogram) < 2:
+            histogram[rng.randrange(5)] += 2
+        histograms.append(histogram)
+    return histograms
+
+
+def expand(histogram):
+    return [score for score, n in enumerate(histogram, start=1) for _ in range(n)]
+
+
+def test_matches_statistics_on_random_histograms():
+    histograms = random_histograms(random.Random(20250), 3000)
+    computed = histogram_stats(histograms)
+    modes = histogram_mode(histograms)
+    for histogram, (median, mode, stdev), single_mode in zip(histograms, computed, modes):
+        scores = expand(histogram)
+        assert median == statistics.median(scores)
+        assert type(median) is type(statistics.median(scores))
+        assert mode == single_mode == statistics.mode(scores)
+        # same float to the last bit, not approximately
+        assert stdev == statistics.stdev(scores)
+
+
+def test_batched_rows_match_single_rows():
+    histograms = random_histograms(random.Random(7), 200)
+    assert histogram_stats(histograms) == [histogram_stats([histogram])[0] for histogram in histograms]
+
+
+@pytest.mark.skipif(not hasattr(statistics, '_float_sqrt_of_frac'),
+                    reason='this Python has no statistics._float_sqrt_of_frac to compare with')
+def test_sqrt_helpers_match_cpython():
+    rng = random.Random(11)
+    for _ in range(3000):
+        n = rng.getrandbits(rng.randint(1, 200))
+        m = rng.getrandbits(rng.randint(1, 200)) or 1
+        assert _integer_sqrt_of_frac_rto(n, m) == statistics._integer_sqrt_of_frac_rto(n, m)
+        assert _sqrt_of_frac(n, m) == statistics._float_sqrt_of_frac(n, m)
+
+
+def test_too_few_responses():
+    with pytest.raises(statistics.StatisticsError):
+        histogram_stats([[0, 0, 1, 0, 0]])
+    with pytest.raises(statistics.StatisticsError):
+        histogram_mode([[0, 0, 0, 0, 0]])
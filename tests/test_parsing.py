@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+import analyzer
+import common.parsing
+from conftest import SRC_DIR
+from get_course_myharvard import CourseScraper
+
+pytest.importorskip("lxml")
+
+BACKENDS = ("lxml", "html.parser")
+QGUIDE_DIR = os.path.join(SRC_DIR, "qguide")
+# a beta.my.harvard.edu course page, with the elements CourseScraper reads
+COURSE_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "myharvard_course.html")
+
+
+def with_backend(monkeypatch, backend, extract, *args):
+    monkeypatch.setattr(common.parsing, "DEFAULT_BACKEND", backend)
+    return extract(*args)
+
+
+def test_qguide_records_match(monkeypatch):
+    monkeypatch.chdir(QGUIDE_DIR)
+    monkeypatch.setattr(analyzer, "store_path", None)
+    codes = sorted(name[:-len(".html")] for name in os.listdir("QGuides"))[:25]
+    ratings = {backend: [with_backend(monkeypatch, backend, analyzer.analyze, code) for code in codes]
+               for backend in BACKENDS}
+    assert all(ratings["lxml"])
+    assert ratings["lxml"] == ratings["html.parser"]
+
+
+def test_myharvard_records_match(monkeypatch):
+    with open(COURSE_PAGE, encoding="utf-8") as f:
+        page = f.read()
+    courses = {backend: with_backend(monkeypatch, backend, CourseScraper("").parse, page) for backend in BACKENDS}
+    assert courses["lxml"].course_title == "Course number 7 & more"
+    assert courses["lxml"] == courses["html.parser"]
+    enrollment = {backend: with_backend(monkeypatch, backend, CourseScraper("").parse_enrollment, page)
+                  for backend in BACKENDS}
+    assert enrollment["lxml"] == enrollment["html.parser"] == {"enrolled": "151", "waitlist": "1"}